@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+
+# Compare the xmltodict and stream parser engines on the test_100 filings
+#
+# python -m benchmarks.bench_engine -n 5
+#
+
+
+import argparse
+import contextlib
+import io
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from edgar import run_form4
+
+
+def bench_engine(input_path, engine, repeat):
+    """
+    This function runs run_form4 with one engine and returns the elapsed time
+
+    input_path: Path obj, directory for input files
+    engine:     string, "xmltodict" or "stream"
+    repeat:     int, number of runs, the best time is returned
+    return:     float, seconds
+    """
+
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as output_path:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_form4(input_path, output_path, False, engine=engine)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the Form 4 parser engines')
+    parser.add_argument('-i','--input_path', type=str, default='./tests/test_100', help='Directory of input files. Default is ./tests/test_100', required=False)
+    parser.add_argument('-c','--copies', type=int, default=10, help='Number of copies of the input files. Default is 10', required=False)
+    parser.add_argument('-n','--repeat', type=int, default=3, help='Number of runs per engine. Default is 3', required=False)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as input_path:
+        n_files = 0
+        for i in range(args.copies):
+            for file in Path(args.input_path).glob("*.txt"):
+                shutil.copy(file, Path(input_path) / (str(i) + "_" + file.name))
+                n_files += 1
+
+        times = {engine: bench_engine(input_path, engine, args.repeat) for engine in ("xmltodict", "stream")}
+
+    for engine, elapsed in times.items():
+        print("%-10s %8.3f s  %8.1f filings/s" % (engine, elapsed, n_files / elapsed))
+    print("speedup    %8.2fx" % (times["xmltodict"] / times["stream"]))
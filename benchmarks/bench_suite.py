@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+
+# Throughput benchmark on synthetic filings, with per-stage timings and a regression check
+#
+# python -m benchmarks.bench_suite -s 1000,10000
+# python -m benchmarks.bench_suite -s 1000 --save_baseline
+# python -m benchmarks.bench_suite -s 1000 --check
+#
+
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from edgar import run_form4
+from .synth_form4 import write_synth_form4
+
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+
+
+def bench_run_form4(input_path, engine, workers=1):
+    """
+    This function times run_form4 end to end on a directory of filings
+
+    input_path: Path obj, directory for input files, with a list_txt file
+    engine:     string, "xmltodict" or "stream"
+    workers:    int, number of processes
+    return:     (float seconds, dict stage -> seconds), the stages are the timers of run_form4
+                (see Form4Metrics), summed over the worker processes
+    """
+
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run_form4(input_path, output_path, True, engine=engine, workers=workers, verbose=False)
+
+        return time.perf_counter() - start, report["metrics"]["stages"]
+
+
+def run_suite(sizes, engines, template_path, seed=0, workers=1):
+    """
+    This function generates synthetic filings for each size and benchmarks each engine on them
+
+    sizes:         list of int, number of filings
+    engines:       list of strings
+    template_path: Path obj, directory of the template filings
+    seed:          int, seed of the generator
+    workers:       int, number of processes for run_form4
+    return:        dict, "<engine>/<size>" -> {"filings": int, "seconds": float, "filings_per_s": float,
+                   "stages": dict stage -> seconds}
+    """
+
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as input_path:
+            input_path = Path(input_path)
+            write_synth_form4(input_path, size, template_path, seed)
+            for engine in engines:
+                seconds, stages = bench_run_form4(input_path, engine, workers)
+                results[engine + "/" + str(size)] = {
+                    "filings": size,
+                    "seconds": seconds,
+                    "filings_per_s": size / seconds,
+                    "stages": stages,
+                    }
+
+    return results
+
+
+def check_baseline(results, baseline, threshold):
+    """
+    This function compares the throughput with a saved baseline
+
+    results:   dict, see run_suite
+    baseline:  dict, results of an earlier run_suite
+    threshold: float, allowed slowdown, e.g. 0.2 fails below 80% of the baseline filings/s
+    return:    list of strings, one per regression
+    """
+
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["filings_per_s"] / baseline[key]["filings_per_s"]
+        if ratio < 1 - threshold:
+            regressions.append("%s: %.1f filings/s, %.0f%% of baseline %.1f"
+                               % (key, result["filings_per_s"], 100 * ratio, baseline[key]["filings_per_s"]))
+
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for key, result in results.items():
+        line = "%-16s %8d filings %9.3f s %9.1f filings/s" % (key, result["filings"], result["seconds"], result["filings_per_s"])
+        if baseline and key in baseline:
+            line += "  (baseline %.1f, %+.0f%%)" % (baseline[key]["filings_per_s"],
+                                                     100 * (result["filings_per_s"] / baseline[key]["filings_per_s"] - 1))
+        print(line)
+        total = sum(result["stages"].values())
+        for stage, seconds in result["stages"].items():
+            print("    %-20s %9.3f s %5.1f%%" % (stage, seconds, 100 * seconds / total if total else 0.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark suite on synthetic Form 4 filings')
+    parser.add_argument('-s','--sizes', type=str, default='1000', help='Numbers of filings, comma separated, e.g. 1000,10000,100000. Default is 1000', required=False)
+    parser.add_argument('-e','--engines', type=str, default='xmltodict,stream', help='Engines, comma separated. Default is xmltodict,stream', required=False)
+    parser.add_argument('-t','--template_path', type=str, default='./data/form-4', help='Directory of template filings. Default is ./data/form-4', required=False)
+    parser.add_argument('-w','--workers', type=int, default=1, help='Number of processes used by run_form4. Default is 1', required=False)
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generator. Default is 0', required=False)
+    parser.add_argument('--baseline', type=str, default=str(BASELINE_FILE), help='Baseline file. Default is benchmarks/baseline.json', required=False)
+    parser.add_argument('--save_baseline', action='store_true', help='Save the results as the new baseline', required=False)
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if a result is slower than the baseline by more than the threshold', required=False)
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown for --check. Default is 0.2 (20%%)', required=False)
+    args = parser.parse_args()
+
+    sizes   = [int(s) for s in args.sizes.split(",")]
+    engines = args.engines.split(",")
+    results = run_suite(sizes, engines, args.template_path, args.seed, args.workers)
+
+    baseline_file = Path(args.baseline)
+    baseline = None
+    if baseline_file.is_file():
+        with open(baseline_file) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(baseline_file, 'w') as f:
+            json.dump({"python": sys.version.split()[0], "platform": platform.platform(),
+                       "results": results}, f, indent=2)
+        print("Saved baseline to " + str(baseline_file))
+
+    if args.check:
+        if baseline is None:
+            sys.exit("No baseline file " + str(baseline_file))
+        regressions = check_baseline(results, baseline, args.threshold)
+        for line in regressions:
+            print("Regression: " + line)
+        sys.exit(1 if regressions else 0)
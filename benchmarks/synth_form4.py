@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+
+# Generate synthetic Form 4 filings from the shapes of real filings
+#
+# python -m benchmarks.synth_form4 -o ./scratch/synth_1000 -n 1000
+#
+
+
+import argparse
+import random
+import re
+from pathlib import Path
+
+
+# xml elements sampled from the template filings
+BLOCK_TAGS = [
+    "reportingOwner",
+    "nonDerivativeTransaction",
+    "nonDerivativeHolding",
+    "derivativeTransaction",
+    "derivativeHolding",
+    "footnote",
+    ]
+
+
+def load_templates(template_path):
+    """
+    This function reads the template filings and cuts them into pieces that can be recombined
+
+    template_path: Path obj, directory of Form-4.txt files, e.g. data/form-4
+    return:        dict, "bases" (list of (accession number, text before the first reportingOwner,
+                   text from ownerSignature to the end)) and a list of xml blocks per tag of BLOCK_TAGS
+    """
+
+    templates = {"bases": []}
+    for tag in BLOCK_TAGS:
+        templates[tag] = []
+
+    for fileloc in sorted(Path(template_path).glob("*.txt")):
+        text = fileloc.read_text()
+        accession = re.search(r'ACCESSION NUMBER:\s*(\S+)', text).group(1)
+        head = text[:text.find("<reportingOwner>")]
+        head = head[:head.rfind("\n") + 1]
+        tail = text[text.find("<ownerSignature>"):]
+        tail = "    " + tail if "<ownerSignature>" in text else text[text.find("</ownershipDocument>"):]
+        templates["bases"].append((accession, head, tail))
+
+        for tag in BLOCK_TAGS:
+            pattern = r'[ \t]*<' + tag + r'[ >].*?</' + tag + r'>[ \t]*\n'
+            templates[tag] += re.findall(pattern, text, flags=re.DOTALL)
+
+    return templates
+
+
+def synth_form4(templates, rng, number):
+    """
+    This function builds the text of one synthetic filing
+
+    templates: dict, see load_templates
+    rng:       random.Random obj
+    number:    int, number of the filing, used in its accession number
+    return:    (string accession number, string full text of the filing)
+    """
+
+    accession, head, tail = rng.choice(templates["bases"])
+    new_accession = "9999999999-20-%06d" % number
+
+    n_owners      = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+    n_footnotes   = min(_geometric(rng, 0.35), 12)
+    n_nonderiv    = min(_geometric(rng, 0.3), 20)
+    n_nd_holding  = rng.randint(1, 2) if rng.random() < 0.2 else 0
+    n_deriv       = min(_geometric(rng, 0.4), 10) if rng.random() < 0.4 else 0
+    n_d_holding   = 1 if rng.random() < 0.05 else 0
+
+    tables = (_table(rng, templates, "nonDerivative", n_nonderiv, n_nd_holding)
+              + _table(rng, templates, "derivative", n_deriv, n_d_holding))
+    # some values are only a footnote reference, keep at least one footnote for them
+    if not n_footnotes and any("<footnoteId" in block for block in tables):
+        n_footnotes = 1
+
+    parts = [head]
+    parts += _sample(rng, templates["reportingOwner"], n_owners)
+    parts.append("\n")
+    parts += [_footnote_ids(rng, block, n_footnotes) for block in tables]
+
+    if n_footnotes:
+        parts.append("    <footnotes>\n")
+        for i, block in enumerate(_sample(rng, templates["footnote"], n_footnotes)):
+            parts.append(re.sub(r'<footnote id="[^"]*">', '<footnote id="F%d">' % (i + 1), block, count=1))
+        parts.append("    </footnotes>\n\n")
+
+    parts.append(tail)
+
+    return new_accession, "".join(parts).replace(accession, new_accession)
+
+
+def write_synth_form4(output_path, n_files, template_path="./data/form-4", seed=0):
+    """
+    This function writes synthetic Form-4.txt files and a list_txt file with their names
+
+    output_path:   Path obj, directory of the files written
+    n_files:       int, number of filings
+    template_path: Path obj, directory of the template filings
+    seed:          int, seed of the random generator, the same seed gives the same files
+    return:        list of filenames
+    """
+
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    templates = load_templates(template_path)
+    rng       = random.Random(seed)
+
+    filenames = []
+    for number in range(n_files):
+        accession, text = synth_form4(templates, rng, number)
+        filename = "synth_" + str(number) + "_" + accession + ".txt"
+        with open(output_path / filename, 'w') as f:
+            f.write(text)
+        filenames.append(filename)
+
+    with open(output_path / "list_txt", 'w') as f:
+        f.write("".join(filename + "\n" for filename in filenames))
+
+    return filenames
+
+
+def _table(rng, templates, table_name, n_transaction, n_holding):
+    if not n_transaction and not n_holding:
+        return []
+
+    rows = (_sample(rng, templates[table_name + "Transaction"], n_transaction)
+            + _sample(rng, templates[table_name + "Holding"], n_holding))
+
+    return ["    <" + table_name + "Table>\n"] + rows + ["    </" + table_name + "Table>\n\n"]
+
+
+def _footnote_ids(rng, block, n_footnotes):
+    """
+    This function points the footnote references of a row to the footnotes of the new filing
+    """
+
+    if not n_footnotes:
+        return block
+
+    return re.sub(r'<footnoteId id="[^"]*"', lambda m: '<footnoteId id="F%d"' % rng.randint(1, n_footnotes), block)
+
+
+def _sample(rng, blocks, n):
+    if not blocks:
+        return []
+    return [rng.choice(blocks) for _ in range(n)]
+
+
+def _geometric(rng, p):
+    n = 0
+    while rng.random() > p:
+        n += 1
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Synthetic Form 4 filings generator')
+    parser.add_argument('-o','--output_path', type=str, help='Output directory', required=True)
+    parser.add_argument('-n','--n_files', type=int, default=1000, help='Number of filings. Default is 1000', required=False)
+    parser.add_argument('-t','--template_path', type=str, default='./data/form-4', help='Directory of template filings. Default is ./data/form-4', required=False)
+    parser.add_argument('-s','--seed', type=int, default=0, help='Seed of the random generator. Default is 0', required=False)
+    args = parser.parse_args()
+
+    write_synth_form4(args.output_path, args.n_files, args.template_path, args.seed)
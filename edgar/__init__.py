@@ -1,3 +1,11 @@
 from .edgar_form4 import form4_to_csv
 from .edgar_form4 import run_form4
 from .form4data   import Form4Data
+from .form4writer import Form4Writer, Form4ParquetWriter, Form4SQLiteWriter
+from .manifest    import Form4Manifest, PARSER_VERSION
+from .sec_header  import HeaderFilter, parse_sec_header, read_sec_header
+from .metrics     import Form4Metrics
+from .normalize   import Form4Normalizer
+from .watch       import Form4Watcher, watch_form4
+from .cache       import Form4Cache, CACHE_VERSION
+from .aggregate   import Form4Aggregates
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+
+import sqlite3
+import pandas as pd
+from pathlib import Path
+from .form4data import Form4Data
+from .manifest import accession_number
+
+
+# sums kept per (table, issuer, owner, transaction date, transaction code)
+SUM_COL_NAME = ["n_transactions", "shares_acquired", "shares_disposed", "value_acquired", "value_disposed"]
+
+KEY_COL_NAME = ["table_name", "issuerCik", "ownerCik", "date", "transactionCode"]
+
+# issuer level sums: each transaction of a joint filing counts once
+ISSUER_KEY_COL_NAME = ["table_name", "issuerCik", "date", "transactionCode"]
+
+
+class Form4Aggregates:
+    """
+    Create a class for the insider-activity aggregates, saved as aggregates.db (SQLite) in the output directory
+
+    The table "daily" holds, per table ("nonDerivative" or "derivative"), issuer CIK, reporting owner CIK,
+    transaction date and transaction code: the number of transactions, the shares acquired (A) and disposed (D),
+    and their dollar value (shares times price per share; transactions without a price add shares, no value).
+    CIKs are stored without leading zeros. In "daily", a joint filing counts once per reporting owner, as in
+    the .csv files; the table "issuer_daily" holds the same sums without the owner, where each transaction of
+    a joint filing counts once (the rows of its first reporting owner). Queries that do not select or group by
+    owner read "issuer_daily". Holdings (rows without a transaction date or code) are not counted.
+    The table "filings" keeps the contribution of each accession number (ownerCik NULL for "issuer_daily"),
+    so a filing processed again replaces its old contribution instead of being counted twice.
+    Rows are added with add() as filings are written, and saved by commit(); queries read the daily sums only.
+
+    self.fileloc: Path obj, location of aggregates.db
+
+    """
+
+    filename = "aggregates.db"
+
+    def __init__(self, output_path):
+        self.fileloc  = Path(output_path) / self.filename
+        self._pending = {}
+
+        self._conn = sqlite3.connect(self.fileloc, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(KEY_COL_NAME) + ", " + ", ".join(coln + " REAL" for coln in SUM_COL_NAME)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS daily (%s, PRIMARY KEY (%s)) WITHOUT ROWID"
+                               % (columns, ", ".join(KEY_COL_NAME)))
+            self._conn.execute("CREATE TABLE IF NOT EXISTS issuer_daily (%s, PRIMARY KEY (%s)) WITHOUT ROWID"
+                               % (", ".join(ISSUER_KEY_COL_NAME) + ", " + ", ".join(coln + " REAL" for coln in SUM_COL_NAME),
+                                  ", ".join(ISSUER_KEY_COL_NAME)))
+            self._conn.execute("CREATE TABLE IF NOT EXISTS filings (accession TEXT, %s)" % columns)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS daily_issuer ON daily (issuerCik, date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS daily_owner ON daily (ownerCik, date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS daily_date ON daily (date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS issuer_daily_date ON issuer_daily (date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS filings_accession ON filings (accession)")
+
+
+    def add(self, filename, tables):
+        """
+        This function adds the transactions of a filing. They are saved by the next commit()
+
+        filename: string, full filename of Form-4.txt file, the accession number is read from it
+        tables:   list of (name of database, list of rows), see form4_to_records
+        """
+
+        sums   = {}
+        # the rows of a table are repeated for each reporting owner, those of the first owner count once
+        # at issuer level; tables may hold one entry per owner
+        owners = {}
+        for table_name, rows in tables:
+            if table_name not in ("nonDerivative", "derivative") or not rows:
+                continue
+            columns = Form4Data.column_list(table_name)
+            i_issuer, i_owner, i_date, i_code, i_shares, i_ad, i_price = (columns.index(c) for c in (
+                "issuerCik", "reportingOwnerId.rptOwnerCik", "transactionDate.value",
+                "transactionCoding.transactionCode", "transactionAmounts.transactionShares.value",
+                "transactionAmounts.transactionAcquiredDisposedCode.value",
+                "transactionAmounts.transactionPricePerShare.value"))
+
+            first_owner = owners.setdefault(table_name, _cik(rows[0][i_owner]))
+            for row in rows:
+                date = (row[i_date] or "").strip()[:10]
+                code = (row[i_code] or "").strip()
+                # holdings have no transaction date or code, they are not transactions
+                if not date or not code:
+                    continue
+                owner  = _cik(row[i_owner])
+                keys   = [(table_name, _cik(row[i_issuer]), owner, date, code)]
+                if owner == first_owner:
+                    keys.append((table_name, _cik(row[i_issuer]), None, date, code))
+                shares = _number(row[i_shares])
+                value  = shares * _number(row[i_price])
+                acquired_disposed = (row[i_ad] or "").strip().upper()
+                for key in keys:
+                    total = sums.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0])
+                    total[0] += 1
+                    if acquired_disposed == "A":
+                        total[1] += shares
+                        total[3] += value
+                    elif acquired_disposed == "D":
+                        total[2] += shares
+                        total[4] += value
+
+        # a filing added twice before a commit keeps its last rows
+        self._pending[accession_number(filename)] = sums
+
+        return
+
+
+    def commit(self):
+        """
+        This function saves the filings added: in one transaction, the old contribution of each accession
+        number is subtracted from the daily and issuer_daily sums, and the new one is added
+        """
+
+        if not self._pending:
+            return
+
+        key_cols = ", ".join(KEY_COL_NAME)
+        sum_cols = ", ".join(SUM_COL_NAME)
+        i_owner  = KEY_COL_NAME.index("ownerCik")
+        daily    = _upsert("daily", KEY_COL_NAME)
+        issuer   = _upsert("issuer_daily", ISSUER_KEY_COL_NAME)
+
+        def upsert(rows):
+            # rows without owner go to issuer_daily
+            self._conn.executemany(daily, [row for row in rows if row[i_owner] is not None])
+            self._conn.executemany(issuer, [row[:i_owner] + row[i_owner + 1:] for row in rows if row[i_owner] is None])
+
+        with self._conn:
+            accessions = list(self._pending)
+            for j in range(0, len(accessions), 500):
+                part = accessions[j:j + 500]
+                marks = ",".join("?" * len(part))
+                old = self._conn.execute("SELECT %s, %s FROM filings WHERE accession IN (%s)"
+                                         % (key_cols, sum_cols, marks), part).fetchall()
+                if old:
+                    upsert([row[:len(KEY_COL_NAME)] + tuple(-v for v in row[len(KEY_COL_NAME):]) for row in old])
+                    self._conn.execute("DELETE FROM filings WHERE accession IN (%s)" % marks, part)
+
+            new = [(accession,) + key + tuple(total)
+                   for accession, sums in self._pending.items() for key, total in sums.items()]
+            self._conn.executemany("INSERT INTO filings VALUES (%s)" % ",".join("?" * (1 + len(KEY_COL_NAME) + len(SUM_COL_NAME))), new)
+            upsert([row[1:] for row in new])
+            self._conn.execute("DELETE FROM daily WHERE n_transactions <= 0")
+            self._conn.execute("DELETE FROM issuer_daily WHERE n_transactions <= 0")
+
+        self._pending = {}
+
+        return
+
+
+    def close(self):
+        try:
+            self.commit()
+        finally:
+            self._conn.close()
+
+        return
+
+
+    def query(self, issuer_cik=None, owner_cik=None, date_from=None, date_to=None, table_name="nonDerivative",
+              transaction_code=None, group_by=("date",)):
+        """
+        This function returns the sums of the transactions selected, from the daily sums. Without owner_cik
+        and "ownerCik" in group_by, a transaction of a joint filing counts once; otherwise once per owner
+
+        issuer_cik:       string or list of strings, issuers selected (leading zeros do not matter)
+        owner_cik:        string or list of strings, reporting owners selected
+        date_from:        string, YYYY-MM-DD, first transaction date
+        date_to:          string, YYYY-MM-DD, last transaction date
+        table_name:       string, "nonDerivative" or "derivative"
+        transaction_code: string or list of strings, e.g. ["P", "S"] for open market purchases and sales
+        group_by:         list of "issuerCik", "ownerCik", "date" and "transactionCode", empty for one total
+        return:           pandas DataFrame, group_by columns and n_transactions, shares_acquired, shares_disposed,
+                          net_shares, value_acquired, value_disposed and net_value
+        """
+
+        group_by = list(group_by)
+        for coln in group_by:
+            if coln not in KEY_COL_NAME[1:]:
+                raise ValueError("Unknown group_by column: " + str(coln))
+        by_owner = owner_cik is not None or "ownerCik" in group_by
+
+        conditions = ["table_name = ?"]
+        params     = [table_name]
+        for coln, values in (("issuerCik", issuer_cik), ("ownerCik", owner_cik), ("transactionCode", transaction_code)):
+            if values is None:
+                continue
+            if isinstance(values, (str, int)):
+                values = [values]
+            values = [_cik(v) for v in values] if coln != "transactionCode" else list(values)
+            conditions.append("%s IN (%s)" % (coln, ",".join("?" * len(values))))
+            params += values
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date <= ?")
+            params.append(date_to)
+
+        select = ", ".join(group_by + ["SUM(%s) AS %s" % (c, c) for c in SUM_COL_NAME])
+        sql = "SELECT %s FROM %s WHERE %s" % (select, "daily" if by_owner else "issuer_daily", " AND ".join(conditions))
+        if group_by:
+            sql += " GROUP BY %s ORDER BY %s" % (", ".join(group_by), ", ".join(group_by))
+
+        df = pd.read_sql_query(sql, self._conn, params=params)
+        df[SUM_COL_NAME] = df[SUM_COL_NAME].fillna(0.0)
+        df["n_transactions"] = df["n_transactions"].astype("int64")
+        df["net_shares"] = df["shares_acquired"] - df["shares_disposed"]
+        df["net_value"]  = df["value_acquired"] - df["value_disposed"]
+
+        return df
+
+
+    def rolling(self, days, issuer_cik=None, owner_cik=None, date_from=None, date_to=None,
+                table_name="nonDerivative", transaction_code=None):
+        """
+        This function returns the sums over a rolling window of calendar days ending on each day
+
+        days:   int, length of the window, e.g. 30
+        others: see query
+        return: pandas DataFrame indexed by date, one row per calendar day from date_from to date_to
+                (default: first and last transaction dates), with the columns of query
+        """
+
+        start = None
+        if date_from:
+            start = (pd.Timestamp(date_from) - pd.Timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        df = self.query(issuer_cik, owner_cik, start, date_to, table_name, transaction_code, group_by=["date"])
+
+        # rows without a transaction date are not in any window
+        df.index = pd.to_datetime(df.pop("date"), format="%Y-%m-%d", errors="coerce")
+        df.index.name = "date"
+        df = df[df.index.notna()]
+        if df.empty and not (date_from and date_to):
+            return df
+
+        first = pd.Timestamp(date_from) if date_from else df.index.min()
+        last  = pd.Timestamp(date_to) if date_to else df.index.max()
+        calendar = pd.date_range(first - pd.Timedelta(days=days - 1), last, name="date")
+        df = df.reindex(calendar, fill_value=0).rolling(days, min_periods=1).sum()
+        df["n_transactions"] = df["n_transactions"].astype("int64")
+
+        return df.loc[first:last]
+
+
+def _upsert(table_name, key_col_name):
+    return ("INSERT INTO %s VALUES (%s) ON CONFLICT (%s) DO UPDATE SET %s"
+            % (table_name, ",".join("?" * (len(key_col_name) + len(SUM_COL_NAME))), ", ".join(key_col_name),
+               ", ".join("%s = %s + excluded.%s" % (c, c, c) for c in SUM_COL_NAME)))
+
+
+def _cik(value):
+    return str(value or "").strip().lstrip("0")
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+
+import io
+import gzip
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+
+
+# archives read by iter_archive
+ARCHIVE_SUFFIXES = (".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".tar", ".zip", ".gz")
+
+
+def is_archive(path):
+    """
+    This function checks if the input is an archive file instead of a directory
+
+    path:   string or Path obj
+    return: boolean
+    """
+
+    path = Path(path)
+
+    return path.is_file() and path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def iter_archive(path):
+    """
+    This function reads the Form-4.txt members of a .tar(.gz), .zip or .gz archive, one member at a time,
+    in the order they are stored. Nothing is extracted to disk, only one member is held in memory.
+    A .gz file that is not a tar archive is a single compressed Form-4.txt file.
+
+    path:   string or Path obj, archive file
+    return: generator of (filename, bytes content), filename without the directories of the member
+    """
+
+    path = Path(path)
+    name = path.name.lower()
+
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _is_form4txt(info.filename):
+                    yield PurePosixPath(info.filename).name, zf.read(info)
+
+    elif name.endswith(".gz") and not name.endswith((".tar.gz", ".tgz")) and not tarfile.is_tarfile(path):
+        yield path.name[:-3], read_gzip(path)
+
+    else:
+        # stream mode: members are read in sequence, the archive is never rewound
+        with tarfile.open(path, mode="r|*") as tf:
+            for member in tf:
+                if member.isfile() and _is_form4txt(member.name):
+                    yield PurePosixPath(member.name).name, tf.extractfile(member).read()
+
+
+def read_gzip(fileloc):
+    """
+    This function reads a single compressed Form-4.txt.gz file
+
+    fileloc: Path obj, location of .gz file
+    return:  bytes, decompressed content
+    """
+
+    with gzip.open(fileloc, 'rb') as f:
+        return f.read()
+
+
+def decode_form4txt(data):
+    """
+    This function decodes the content of a Form-4.txt file the same way open() reads it
+    in text mode (default encoding, universal newlines)
+
+    data:   bytes, file content
+    return: string
+    """
+
+    return io.TextIOWrapper(io.BytesIO(data)).read()
+
+
+def _is_form4txt(name):
+    return name.endswith(".txt")
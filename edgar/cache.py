@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+from pathlib import Path
+
+
+# version of the parsed filings stored in the cache. Changed only when the parsers extract different data,
+# not when the columns of Form4Data change: rows are projected from the cached data on each run
+CACHE_VERSION = "1"
+
+
+class Form4Cache:
+    """
+    Create a class for the on-disk cache of parsed filings, saved as form4cache.db (SQLite) in the cache directory
+
+    Each entry is the full extraction of one filing, before the rows are projected on the Form4Data columns:
+    issuer, reporting owners, all the fields of each table row, footnotes, and the <SEC-HEADER> fields.
+    Entries are keyed by the sha1 of the file content, the parser engine and CACHE_VERSION, and stored as
+    zlib compressed json. A filing found in the cache is not parsed again; after a change of the column lists,
+    a rerun only builds the rows from the cache.
+    New entries are kept in memory and written by commit(), in one short transaction. Worker processes open
+    the cache read only and hand their new entries to the main process (take_pending, add_pending), so only
+    one process writes. When the cache grows above max_bytes, the least recently used entries are removed.
+
+    self.fileloc:   Path obj, location of form4cache.db
+    self.max_bytes: int, maximum size of the compressed entries
+    self.readonly:  boolean, entries are never written by this obj
+    self.hits:      int, number of filings found in the cache
+    self.misses:    int, number of filings not found
+
+    """
+
+    filename = "form4cache.db"
+
+    # entries kept in memory before commit() is called by put
+    max_pending = 500
+
+    def __init__(self, cache_path, max_bytes=2**30, readonly=False):
+        self.fileloc   = Path(cache_path) / self.filename
+        self.max_bytes = max_bytes
+        self.readonly  = readonly
+        self.hits      = 0
+        self.misses    = 0
+        self._new      = []
+        self._used     = []
+
+        if readonly:
+            self._conn = sqlite3.connect(self.fileloc.resolve().as_uri() + "?mode=ro", uri=True, timeout=60)
+            self._size = 0
+            return
+
+        Path(cache_path).mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.fileloc, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS filings "
+                               "(key TEXT PRIMARY KEY, size INTEGER, last_used REAL, value BLOB)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS filings_last_used ON filings (last_used)")
+        # size of the entries, kept up to date by commit and _evict
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM filings").fetchone()[0]
+
+
+    def get(self, key):
+        """
+        This function returns the cached extraction of a filing
+
+        key:    string, see key()
+        return: (parts, header) or None when the filing is not in the cache.
+                parts are the arguments of fanout_records, header the dict of parse_sec_header
+        """
+
+        row = self._conn.execute("SELECT value FROM filings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._used.append(key)
+        parts, header = json.loads(zlib.decompress(row[0]))
+
+        return tuple(parts), header
+
+
+    def put(self, key, parts, header):
+        """
+        This function adds the extraction of a filing. Entries are saved by the next commit(),
+        made automatically every max_pending entries unless the cache is read only
+
+        key:    string, see key()
+        parts:  (issuer dict, list of owner dicts, name of database -> list of flat table rows, footnotes dict)
+        header: dict, see parse_sec_header
+        """
+
+        self._new.append((key, zlib.compress(json.dumps([parts, header]).encode('utf-8'), 1)))
+        if not self.readonly and len(self._new) >= self.max_pending:
+            self.commit()
+
+        return
+
+
+    def take_pending(self):
+        """
+        This function returns and forgets the entries added and the keys read since the last call,
+        e.g. in a worker process, to be saved by the main process with add_pending
+
+        return: (list of (key, compressed value), list of keys)
+        """
+
+        pending = (self._new, self._used)
+        self._new  = []
+        self._used = []
+
+        return pending
+
+
+    def add_pending(self, pending):
+        """
+        This function adds the entries returned by take_pending of another Form4Cache obj
+        """
+
+        new, used = pending
+        self._new  += new
+        self._used += used
+        if not self.readonly and len(self._new) >= self.max_pending:
+            self.commit()
+
+        return
+
+
+    def commit(self):
+        """
+        This function saves the new entries and the use of the entries read, then removes the least
+        recently used entries when the cache is larger than max_bytes
+        """
+
+        if self.readonly or not (self._new or self._used):
+            return
+
+        now = time.time()
+        with self._conn:
+            for key, value in self._new:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO filings VALUES (?, ?, ?, ?)",
+                                            (key, len(value), now, value))
+                # same key, same content: an entry already saved is not counted twice
+                if cursor.rowcount == 1:
+                    self._size += len(value)
+            self._conn.executemany("UPDATE filings SET last_used = ? WHERE key = ?", [(now, key) for key in self._used])
+        self._new  = []
+        self._used = []
+
+        if self._size > self.max_bytes:
+            self._evict(self._size - int(0.9 * self.max_bytes))
+
+        return
+
+
+    def close(self):
+        try:
+            self.commit()
+        finally:
+            self._conn.close()
+
+        return
+
+
+    def _evict(self, n_bytes):
+        """
+        This function removes the least recently used entries, about n_bytes in total
+        """
+
+        removed = 0
+        keys    = []
+        for key, size in self._conn.execute("SELECT key, size FROM filings ORDER BY last_used"):
+            if removed >= n_bytes:
+                break
+            keys.append((key,))
+            removed += size
+        with self._conn:
+            self._conn.executemany("DELETE FROM filings WHERE key = ?", keys)
+        self._size -= removed
+
+        return
+
+
+    @staticmethod
+    def key(data, engine):
+        """
+        This function returns the key of a filing: sha1 of the content, engine and CACHE_VERSION
+
+        data:   bytes, content of the file
+        engine: string, "xmltodict" or "stream"
+        """
+
+        return hashlib.sha1(data).hexdigest() + "-" + engine + "-" + CACHE_VERSION
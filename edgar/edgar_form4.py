@@ -4,74 +4,522 @@
 
 import pandas as pd
 import argparse
+import cProfile
 import os
+import time
 from pathlib import Path
-import flatdict
-from .proc_form4 import proc_form4txt, form4txt_to_flatdict, flatdict_to_df, form4df_to_csv, concat_abtoC, save_df_to_csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .form4data import Form4Data
+from .form4writer import Form4Writer, Form4ParquetWriter, Form4SQLiteWriter
+from .sec_header import read_sec_header, parse_sec_header
+from .archive import is_archive, iter_archive, read_gzip, decode_form4txt
+from .feed import iter_feed
+from .manifest import Form4Manifest
+from .normalize import Form4Normalizer
+from .metrics import Form4Metrics
+from .cache import Form4Cache
+from .aggregate import Form4Aggregates
+from .stream_form4 import parse_form4xml
+from .proc_form4 import proc_form4text, extract_form4xml, form4txt_to_flatdict, form4xml_to_flatdict, \
+                        form4dict_to_parts, fanout_records, save_df_to_csv
 
 
-def form4_to_csv(input_path, output_path, filename):
+ENGINES = ("xmltodict", "stream")
+
+
+def form4_to_csv(input_path, output_path, filename, debug=False, engine="xmltodict"):
     """
     This is the main function that reads form 4 file and process it and save it to .csv database
-    
+
     input_path:   Path obj, directory for input files
     output_path:  Path obj, directory for output files
     filename: string, full filename of Form-4.txt file
+    debug:    boolean, write the pre-processed file to output_path/filename.mod and keep it
+    engine:   string, "xmltodict" or "stream" (faster, same output)
     """
-    
-    # pre-processing .txt file, so that xml can be formatted properly with flatdict
-    output_filename = filename + '.mod'
-    proc_form4txt(input_path, output_path, filename, output_filename)
-    
-    # extract xml information to flatdict object
-    full_dict = form4txt_to_flatdict(output_path, output_filename)
-
-    # create subsections from the full dictionary
-    # issuer and reportingOwner first; hopefully these fields are populated
-    issuer_df = flatdict_to_df(full_dict["issuer"])
-          
-    if isinstance(full_dict["reportingOwner"], list):
-        for item in full_dict["reportingOwner"]:
-            tmp = flatdict.FlatDict(item, delimiter='.')
-            reportingOwner_df = flatdict_to_df(tmp)
-            form4df_to_csv(output_path, full_dict, issuer_df, reportingOwner_df)
-        
-        # # DEBUG only: use only one reporting Owner for multiple owner cases
-        # item=full_dict["reportingOwner"][0]
-        # tmp = flatdict.FlatDict(item, delimiter='.')
-        # reportingOwner_df = flatdict_to_df(tmp)
-        # form4df_to_csv(output_path, full_dict, issuer_df, reportingOwner_df)
-        # # DEBUG only
 
-    else:
-        reportingOwner_df = flatdict_to_df(full_dict["reportingOwner"])
-        form4df_to_csv(output_path, full_dict, issuer_df, reportingOwner_df)
-        
+    for table_name, records in form4_to_records(input_path, output_path, filename, debug, engine):
+        save_df_to_csv(output_path, table_name + ".csv", Form4Data.from_records(table_name, records).df)
+
     return
 
 
-def run_form4(input_path, output_path, list_order):
+def form4_to_records(input_path, output_path, filename, debug=False, engine="xmltodict", header_cols=False, data=None,
+                     metrics=None, cache=None):
     """
-    This function calls the main function form4_to_csv
-    
-    input_path:   string, directory for input files
-    output_path:  string, directory for output files
+    This function reads form 4 file and process it into the rows of the .csv database, without saving
+
+    input_path:   Path obj, directory for input files
+    output_path:  Path obj, directory for output files (only used in debug mode)
+    filename: string, full filename of Form-4.txt file
+    debug:    boolean, write the pre-processed file to output_path/filename.mod and keep it.
+              The stream engine does not pre-process, debug is ignored
+    engine:   string, "xmltodict" or "stream" (faster, same output)
+    header_cols: boolean, add the Form4Data.header_col_name columns, read from the <SEC-HEADER>, to each row
+    data:     bytes, content of the file, e.g. an archive member. The file input_path/filename is read when None
+    metrics:  Form4Metrics obj, adds the time of each stage and the counts of the filing
+    cache:    Form4Cache obj, the extraction of a filing already in the cache is not parsed again.
+              Not used in debug mode
+    return:   list of (name of database, list of rows), in the order they are saved.
+              Rows are tuples in the column order of Form4Data.column_list
+    """
+
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine: " + str(engine))
+
+    start = time.perf_counter()
+    if data is None:
+        with open(input_path / filename, 'rb') as f:
+            data = f.read()
+    read_end = time.perf_counter()
+
+    cached = None
+    if cache is not None and not debug:
+        key    = cache.key(data, engine)
+        cached = cache.get(key)
+        if metrics is not None:
+            metrics.add_count("cache_hits" if cached is not None else "cache_misses")
+            metrics.add_time("cache", time.perf_counter() - read_end)
+
+    if cached is None:
+        decode_start = time.perf_counter()
+        text = decode_form4txt(data)
+        if metrics is not None:
+            metrics.add_time("read", read_end - start + time.perf_counter() - decode_start)
+        parts  = _form4_to_parts(output_path, filename, debug, engine, text, metrics)
+        header = parse_sec_header(text) if header_cols or cache is not None else None
+        if cache is not None and not debug:
+            cache.put(key, parts, header)
+    else:
+        parts, header = cached
+        if metrics is not None:
+            metrics.add_time("read", read_end - start)
+
+    records_start = time.perf_counter()
+    tables = fanout_records(*parts)
+    if metrics is not None:
+        metrics.add_time("records", time.perf_counter() - records_start)
+        metrics.add_count("owners", len(parts[1]))
+        metrics.add_count("footnotes", len(parts[3]))
+
+    if header_cols:
+        extra  = tuple(header[c] for c in Form4Data.header_col_name)
+        tables = [(table_name, [row + extra for row in records]) for table_name, records in tables]
+
+    if metrics is not None:
+        metrics.add_file(filename, len(data), time.perf_counter() - start, tables)
+
+    return tables
+
+
+def _form4_to_parts(output_path, filename, debug, engine, text, metrics):
+    """
+    This function parses the xml of a filing into the arguments of fanout_records
+    """
+
+    clock = time.perf_counter
+    t0  = clock()
+    xml = extract_form4xml(text)
+    t1  = clock()
+
+    if engine == "stream":
+        doc   = parse_form4xml(xml)
+        parts = (doc["issuer"], doc["owners"], doc["tables"], doc["footnotes"])
+        t2    = t1
+    elif debug:
+        # pre-processing .txt file, so that xml can be formatted properly with flatdict
+        output_filename = filename + '.mod'
+        with open(output_path / output_filename, 'w') as f:
+            f.write(proc_form4text(text))
+        t2 = clock()
+
+        # extract xml information to flatdict object
+        parts = form4dict_to_parts(form4txt_to_flatdict(output_path, output_filename, keep_mod=True))
+    else:
+        # same pre-processing and extraction, done in memory
+        xml   = proc_form4text(xml)
+        t2    = clock()
+        parts = form4dict_to_parts(form4xml_to_flatdict(xml))
+    t3 = clock()
+
+    if metrics is not None:
+        metrics.add_time("extract_xml", t1 - t0)
+        if engine == "xmltodict":
+            metrics.add_time("preprocess", t2 - t1)
+        metrics.add_time("parse_xml", t3 - t2)
+
+    return parts
+
+
+def list_form4txt(input_path, list_order):
+    """
+    This function lists the Form-4.txt files to read, and the compressed Form-4.txt.gz files
+
+    input_path: string, directory for input files
     list_order: boolean, read the .txt files in the order specified by a file "list_txt"
+    return:     generator of filenames
     """
-    
+
     if not list_order:
         directory = os.fsencode(input_path)
         for file in os.listdir(directory):
             filename = os.fsdecode(file)
-            if filename.endswith(".txt"): 
-                print("Processing: " + filename)
-                form4_to_csv(Path(input_path), Path(output_path), filename)
+            if filename.endswith(".txt") or filename.endswith(".txt.gz"):
+                yield filename
     else:
         fileloc = Path(input_path) / "list_txt"
         with open(fileloc, 'r') as f:
             for line in f:
                 filename = line.strip()
-                print("Processing: " + filename)
-                form4_to_csv(Path(input_path), Path(output_path), filename)
+                if not (Path(input_path) / filename).exists() and (Path(input_path) / (filename + ".gz")).exists():
+                    filename += ".gz"
+                yield filename
+
+
+def list_form4inputs(input_path, list_order):
+    """
+    This function lists the Form-4.txt files of a directory or of an archive (.tar.gz, .zip, .gz).
+    Compressed files are decompressed in memory, one at a time.
+    Any other file is read as a feed of <SEC-DOCUMENT> blocks, see iter_feed.
+
+    input_path: Path obj, directory for input files, archive file or feed file
+    list_order: boolean, read the .txt files of a directory in the order specified by a file "list_txt".
+                Members of an archive are read in the order they are stored
+    return:     generator of (filename, bytes content or None when the file is read from input_path/filename)
+    """
+
+    if is_archive(input_path):
+        yield from iter_archive(input_path)
+        return
+    if Path(input_path).is_file():
+        yield from iter_feed(input_path)
+        return
+
+    for filename in list_form4txt(input_path, list_order):
+        if filename.endswith(".gz"):
+            yield filename[:-3], read_gzip(input_path / filename)
+        else:
+            yield filename, None
+
+
+def filter_form4inputs(input_path, items, header_filter, report, metrics=None):
+    """
+    This function keeps the files whose <SEC-HEADER> matches a filter. Only the header bytes are read
+
+    input_path:    Path obj, directory for input files
+    items:         iterable of (filename, bytes content or None), see list_form4inputs
+    header_filter: HeaderFilter obj
+    report:        dict, filenames not selected are appended to its "filtered" list
+    metrics:       Form4Metrics obj, adds the time spent in the filter
+    return:        generator of the items selected
+    """
+
+    for item in items:
+        filename, data = item
+        start = time.perf_counter()
+        if data is None:
+            header = read_sec_header(input_path / filename)
+        else:
+            header = parse_sec_header(data[:65536].decode('utf-8', errors='replace'))
+        selected = header_filter.match(header)
+        if metrics is not None:
+            metrics.add_time("header_filter", time.perf_counter() - start)
+
+        if selected:
+            yield item
+        else:
+            report["filtered"].append(filename)
+
+
+def run_form4(input_path, output_path, list_order, debug=False, workers=1, chunksize=8,
+              buffer_rows=10000, buffer_bytes=16 * 2**20, engine="xmltodict", incremental=False,
+              output_format="csv", header_filter=None, header_cols=False, verbose=True, profile=None, top_n=10,
+              normalized=False, cache_path=None, cache_bytes=2**30, aggregates=False):
+    """
+    This function calls the main function form4_to_csv
+
+    input_path:   string, directory for input files, archive file (.tar.gz, .tgz, .tar, .zip, .gz),
+                  or feed file of many <SEC-DOCUMENT> blocks (only the Form 4 documents are read)
+    output_path:  string, directory for output files
+    list_order: boolean, read the .txt files in the order specified by a file "list_txt"
+    debug:      boolean, keep the pre-processed .txt.mod files in output_path
+    workers:    int, number of processes parsing files. Output is saved by this process in the
+                same order as workers=1
+    chunksize:  int, number of files sent to a worker process at a time
+    buffer_rows:  int, rows kept in memory before writing to the .csv files
+    buffer_bytes: int, approximate size of text kept in memory before writing to the .csv files
+    engine:     string, "xmltodict" or "stream" (faster, same output)
+    incremental: boolean, skip the files recorded in output_path/manifest.jsonl by an earlier run with the same
+                 output format and csv options, unless their content changed. Rows of changed files replace
+                 the old rows with sqlite; with csv and parquet they are appended, the old rows stay (see "stale")
+    output_format: string, "csv" or "parquet" (typed columns, partitioned by filing year and quarter,
+                   needs pyarrow) or "sqlite" (typed tables in output_path/form4.db, a filing processed again
+                   replaces its rows). Parquet and sqlite rows also have the accessionNumber and filingDate columns
+    header_filter: HeaderFilter obj, only process the filings whose <SEC-HEADER> matches. The header is read
+                   before the xml, filings that do not match are not parsed
+    header_cols: boolean, add the accessionNumber and filingDate columns to the .csv files
+                 (do not mix with .csv files written without them)
+    verbose:    boolean, print the name of each file processed
+    profile:    string, save cProfile statistics of this process to this file (worker processes are not profiled)
+    top_n:      int, number of slowest files kept in the metrics
+    normalized: boolean, write issuers.csv and reportingOwners.csv once per distinct issuer and owner, and
+                nonDerivativeFact.csv and derivativeFact.csv that refer to them by key (csv output only).
+                Form4Data.from_normalized joins them back
+    cache_path: string, directory of a Form4Cache of parsed filings. Filings already in the cache are not parsed
+                again, only their rows are built; use it to rerun after a change of the Form4Data columns
+    cache_bytes: int, maximum size of the cache, the least recently used filings are removed
+    aggregates: boolean, update the insider-activity sums of output_path/aggregates.db with the filings written,
+                see Form4Aggregates
+    return:     dict, lists of filenames "processed", "changed" (processed again), "stale" (changed, old rows
+                still in the output), "skipped", "duplicate" (accession number already in this run, with incremental)
+                and "filtered" (not selected by header_filter),
+                and "metrics" (see Form4Metrics.to_dict)
+    """
+
+    start       = time.perf_counter()
+    input_path  = Path(input_path)
+    output_path = Path(output_path)
+    items       = list_form4inputs(input_path, list_order)
+    report      = {"processed": [], "changed": [], "stale": [], "skipped": [], "duplicate": [], "filtered": []}
+    metrics     = Form4Metrics(top_n)
+
+    if header_filter is not None:
+        items = filter_form4inputs(input_path, items, header_filter, report, metrics)
+
+    manifest = None
+    if incremental:
+        manifest  = Form4Manifest(output_path, output_format, header_cols, normalized)
+        items    = manifest.filter(input_path, items, report)
+
+    writer, normalizer, header_cols = open_form4output(output_path, output_format, buffer_rows, buffer_bytes,
+                                                       header_cols, normalized)
+
+    profiler = None
+    if profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # only this process writes to the cache, worker processes read it and return their new entries
+    cache = None
+    if cache_path is not None:
+        cache = Form4Cache(cache_path, cache_bytes)
+
+    aggregator = Form4Aggregates(output_path) if aggregates else None
+
+    try:
+        with writer:
+            writer.on_flush = commit_form4output(manifest, aggregator)
+
+            if workers <= 1:
+                results = ((filename, form4_to_records(input_path, output_path, filename, debug, engine,
+                                                       header_cols, data, metrics, cache))
+                           for filename, data in _print_processing(items, verbose))
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                results  = _parallel_results(executor, items, chunksize, 2 * workers, metrics, verbose, cache,
+                                             input_path, output_path, debug, engine, header_cols, top_n,
+                                             cache_path)
+
+            try:
+                for filename, tables in results:
+                    add_form4output(writer, normalizer, manifest, filename, tables, report, metrics, aggregator)
+            finally:
+                if workers > 1:
+                    executor.shutdown(cancel_futures=True)
+            # rows left in the buffer are written when the writer is closed
+            close_start = time.perf_counter()
+        metrics.add_time("write", time.perf_counter() - close_start)
+    finally:
+        if aggregator is not None:
+            aggregator.close()
+        if cache is not None:
+            cache.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+
+    report["metrics"] = metrics.to_dict(time.perf_counter() - start)
+
+    if verbose and report["filtered"]:
+        print("Filtered out %d files by header" % len(report["filtered"]))
+    if verbose and report["skipped"]:
+        print("Skipped %d files already processed" % len(report["skipped"]))
+    if verbose and report["duplicate"]:
+        print("Skipped %d files with the accession number of another file of this run" % len(report["duplicate"]))
+    _print_stale(report)
+
+    return report
+
+
+def _print_stale(report):
+    if report["stale"]:
+        print("Warning: %d changed files processed again, their old rows are still in the output files: %s"
+              % (len(report["stale"]), ", ".join(report["stale"][:10]) + (", ..." if len(report["stale"]) > 10 else "")))
+
+    return
+
+
+def open_form4output(output_path, output_format="csv", buffer_rows=10000, buffer_bytes=16 * 2**20,
+                     header_cols=False, normalized=False):
+    """
+    This function creates the writer of an output format, see run_form4
+
+    output_path:   Path obj, directory for output files
+    output_format: string, "csv", "parquet" or "sqlite"
+    buffer_rows:   int, rows kept in memory before writing
+    buffer_bytes:  int, approximate size of text kept in memory before writing
+    header_cols:   boolean, add the Form4Data.header_col_name columns (always added for parquet and sqlite)
+    normalized:    boolean, split the rows with a Form4Normalizer (csv only)
+    return:        (Form4Writer obj, Form4Normalizer obj or None, boolean header_cols)
+    """
+
+    if output_format == "csv":
+        writer = Form4Writer(output_path, buffer_rows, buffer_bytes,
+                             Form4Data.header_col_name if header_cols else None)
+    elif output_format == "parquet":
+        header_cols = True
+        writer = Form4ParquetWriter(output_path, buffer_rows, buffer_bytes, Form4Data.header_col_name)
+    elif output_format == "sqlite":
+        header_cols = True
+        writer = Form4SQLiteWriter(output_path, buffer_rows, buffer_bytes, Form4Data.header_col_name)
+    else:
+        raise ValueError("Unknown output format: " + str(output_format))
+
+    normalizer = None
+    if normalized:
+        if output_format != "csv":
+            writer.close()
+            raise ValueError("Normalized output is only available in csv format")
+        normalizer = Form4Normalizer(output_path)
+
+    return writer, normalizer, header_cols
+
+
+def add_form4output(writer, normalizer, manifest, filename, tables, report, metrics, aggregates=None):
+    """
+    This function adds the rows of a parsed filing to the writer, and records it in the manifest and report
+
+    writer:     Form4Writer obj, see open_form4output
+    normalizer: Form4Normalizer obj or None
+    manifest:   Form4Manifest obj or None
+    filename:   string
+    tables:     list of (name of database, list of rows), see form4_to_records
+    report:     dict, filename is appended to its "processed" list
+    metrics:    Form4Metrics obj, adds the time spent in the writer
+    aggregates: Form4Aggregates obj or None
+    """
+
+    write_start = time.perf_counter()
+    if normalizer is None:
+        writer.add_filing(tables)
+    else:
+        writer.add_filing([split for table_name, records in tables
+                           for split in normalizer.split(table_name, records)])
+    if manifest is not None:
+        manifest.add(filename, tables)
+    if aggregates is not None:
+        aggregates.add(filename, tables)
+    metrics.add_time("write", time.perf_counter() - write_start)
+    report["processed"].append(filename)
 
     return
+
+
+def commit_form4output(manifest, aggregates):
+    """
+    This function returns the on_flush function of the writer: once rows are written, the filings
+    are saved in the aggregates, then in the manifest
+
+    manifest:   Form4Manifest obj or None
+    aggregates: Form4Aggregates obj or None
+    return:     function or None
+    """
+
+    if manifest is None and aggregates is None:
+        return None
+
+    def on_flush():
+        if aggregates is not None:
+            aggregates.commit()
+        if manifest is not None:
+            manifest.commit()
+
+    return on_flush
+
+
+def _print_processing(items, verbose=True):
+    if not verbose:
+        yield from items
+        return
+    for item in items:
+        print("Processing: " + item[0])
+        yield item
+
+
+def _parallel_results(executor, items, chunksize, max_pending, metrics, verbose, cache, *args):
+    """
+    This function yields (filename, tables) of each file parsed by the worker processes, in order,
+    merges the metrics of the workers, and adds their new cache entries to cache (Form4Cache obj or None)
+    """
+
+    for chunk, (chunk_tables, chunk_metrics, chunk_cache) in _ordered_map(executor, items, chunksize, max_pending, *args):
+        metrics.merge(chunk_metrics)
+        if cache is not None:
+            cache.add_pending(chunk_cache)
+        for (filename, data), tables in zip(_print_processing(chunk, verbose), chunk_tables):
+            yield filename, tables
+
+
+def _ordered_map(executor, items, chunksize, max_pending, *args):
+    """
+    This function sends chunks of files to the worker processes and yields the results in submission order.
+    At most max_pending chunks are in flight, so memory does not grow with the number of files.
+
+    executor:    ProcessPoolExecutor
+    items:       iterable of (filename, bytes content or None), see list_form4inputs
+    chunksize:   int, number of files per chunk
+    max_pending: int, maximum number of chunks submitted and not yet yielded
+    args:        extra arguments for _form4_chunk_to_records
+    return:      generator of (list of items, (list of tables per item, Form4Metrics obj))
+    """
+
+    pending = deque()
+    chunk   = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunksize:
+            pending.append((chunk, executor.submit(_form4_chunk_to_records, chunk, *args)))
+            chunk = []
+            if len(pending) >= max_pending:
+                done_chunk, future = pending.popleft()
+                yield done_chunk, future.result()
+    if chunk:
+        pending.append((chunk, executor.submit(_form4_chunk_to_records, chunk, *args)))
+
+    while pending:
+        done_chunk, future = pending.popleft()
+        yield done_chunk, future.result()
+
+
+# read only Form4Cache of each worker process, opened on its first chunk
+_worker_cache = {}
+
+
+def _form4_chunk_to_records(chunk, input_path, output_path, debug, engine, header_cols, top_n, cache_path=None):
+    """
+    Worker function: process a list of Form-4.txt files, see form4_to_records.
+    Returns the tables of each file, the metrics and the new cache entries (None without cache)
+    """
+
+    cache = None
+    if cache_path is not None:
+        if cache_path not in _worker_cache:
+            _worker_cache[cache_path] = Form4Cache(cache_path, readonly=True)
+        cache = _worker_cache[cache_path]
+
+    metrics = Form4Metrics(top_n)
+    tables  = [form4_to_records(input_path, output_path, filename, debug, engine, header_cols, data, metrics, cache)
+               for filename, data in chunk]
+
+    return tables, metrics, cache.take_pending() if cache is not None else None
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+
+import os
+import mmap
+from .sec_header import parse_sec_header
+
+
+# submission types kept by iter_feed
+FORM4_TYPES = ("4", "4/A")
+
+
+def iter_feed(fileloc, form_types=FORM4_TYPES):
+    """
+    This function reads a feed file, where many <SEC-DOCUMENT> blocks are back to back, one Form 4 document at a time.
+    The file is memory mapped; only the documents yielded are copied, so memory use does not depend on the feed size.
+
+    fileloc:    Path obj, location of the feed file
+    form_types: tuple of strings, CONFORMED SUBMISSION TYPE of the documents to keep
+    return:     generator of (filename, bytes content), filename is <accession number>.txt
+    """
+
+    with open(fileloc, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            for filename, start, end in split_feed(mm, form_types):
+                yield filename, mm[start:end]
+
+
+def split_feed(mm, form_types=FORM4_TYPES):
+    """
+    This function finds the byte range of each Form 4 document of a feed. Only the <SEC-HEADER> of each
+    document is read, to get its accession number and submission type.
+    A document runs from its <SEC-DOCUMENT> tag to the next one, or to the end of the feed.
+
+    mm:         mmap or bytes obj, content of the feed
+    form_types: tuple of strings, CONFORMED SUBMISSION TYPE of the documents to keep
+    return:     generator of (filename, start, end)
+    """
+
+    n     = 0
+    start = mm.find(b'<SEC-DOCUMENT>')
+    while start >= 0:
+        end = mm.find(b'<SEC-DOCUMENT>', start + 1)
+        if end < 0:
+            end = len(mm)
+
+        header_end = mm.find(b'</SEC-HEADER>', start, end)
+        if header_end < 0:
+            header_end = min(end, start + 65536)
+        header = parse_sec_header(mm[start:header_end].decode('utf-8', errors='replace'))
+
+        if header["submissionType"] in form_types:
+            n += 1
+            filename = (header["accessionNumber"] or "document_" + str(n)) + ".txt"
+            yield filename, start, end
+
+        start = end if end < len(mm) else -1
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 
 
+import re
+import numpy as np
 import pandas as pd
+from pathlib import Path
 
 
 class Form4Data:
@@ -65,6 +68,48 @@ class Form4Data:
         "ownershipNature.natureOfOwnership.value",
         "footnote"
         ]
+    
+    # dimension tables of the normalized output, they do not get the header columns
+    dimension_table_name = ["issuers", "reportingOwners"]
+    
+    # columns read from the <SEC-HEADER> of the filing, added by run_form4 when requested
+    header_col_name = ["accessionNumber", "filingDate"]
+    
+    # typed columns, all other columns are strings
+    date_col_name = [
+        "transactionDate.value",
+        "deemedExecutionDate.value",
+        "exerciseDate.value",
+        "expirationDate.value",
+        "filingDate"
+        ]
+    
+    float_col_name = [
+        "conversionOrExercisePrice.value",
+        "transactionAmounts.transactionShares.value",
+        "transactionAmounts.transactionPricePerShare.value",
+        "underlyingSecurity.underlyingSecurityShares.value",
+        "postTransactionAmounts.sharesOwnedFollowingTransaction.value"
+        ]
+    
+    bool_col_name = [
+        "reportingOwnerRelationship.isDirector",
+        "reportingOwnerRelationship.isOfficer",
+        "reportingOwnerRelationship.isTenPercentOwner",
+        "reportingOwnerRelationship.isOther"
+        ]
+    
+    # text columns always made categorical by compact, whatever their number of distinct values
+    category_col_name = [
+        "issuerName",
+        "reportingOwnerId.rptOwnerName",
+        "reportingOwnerAddress.rptOwnerStreet1",
+        "reportingOwnerAddress.rptOwnerStreet2",
+        "reportingOwnerAddress.rptOwnerCity",
+        "securityTitle.value",
+        "underlyingSecurity.underlyingSecurityTitle.value",
+        "footnote"
+        ]
    
     def __init__(self, df):
         self.df =df
@@ -78,20 +123,50 @@ class Form4Data:
         table_name: string, name of database to create
         orig_df:    pandas DataFrame, full table contains all the data columns        
         """
+        column_list = cls.column_list(table_name)
+        
+        cls._check_col_names(column_list, orig_df.columns.values)
+        records = [tuple(row.get(c) for c in column_list) for row in orig_df.to_dict("records")]
+        
+        return cls.from_records(table_name, records)
+    
+    
+    @classmethod
+    def from_records(cls, table_name, records):
+        """
+        This function creates a DataFrame from rows already in the standard column order
+        
+        table_name: string, name of database to create
+        records:    list of tuples, in the order of column_list(table_name)
+        """
+        
+        return cls(pd.DataFrame(records, columns=cls.column_list(table_name)))
+
+    
+    @classmethod
+    def column_list(cls, table_name):
+        """
+        This function returns the standard column names of a database
+        
+        table_name: string, name of database, "nonDerivative" or "derivative",
+                    or of the normalized output, "issuers", "reportingOwners", "nonDerivativeFact" or "derivativeFact"
+        return:     list of column names
+        """
         if table_name == "nonDerivative":
-            column_list = cls.issuer_col_name + cls.reporting_col_name + cls.nonderivative_col_name
+            return cls.issuer_col_name + cls.reporting_col_name + cls.nonderivative_col_name
         elif table_name == "derivative":
-            column_list = cls.issuer_col_name + cls.reporting_col_name + cls.derivative_col_name
+            return cls.issuer_col_name + cls.reporting_col_name + cls.derivative_col_name
+        # tables of the normalized output, see Form4Normalizer
+        elif table_name == "issuers":
+            return ["issuerKey"] + cls.issuer_col_name
+        elif table_name == "reportingOwners":
+            return ["ownerKey"] + cls.reporting_col_name
+        elif table_name == "nonDerivativeFact":
+            return ["issuerKey", "ownerKey"] + cls.nonderivative_col_name
+        elif table_name == "derivativeFact":
+            return ["issuerKey", "ownerKey"] + cls.derivative_col_name
         else:
             raise ValueError("Unknown table name!")
-            
-        # could do some more checking with column_names after concat         
-        empty_df = pd.DataFrame(columns=column_list)
-        df  = pd.concat([empty_df,orig_df])[column_list]
-
-        cls._check_col_name(empty_df, orig_df)
-        
-        return cls(df)
 
     
     @staticmethod
@@ -111,7 +186,21 @@ class Form4Data:
         #         deemedExecutionDate, empty field, populated field should be deemedExecutionDate.value
         #         transactionTimeliness, empty field, pupulated field should be transactionTimeliness.value
 
-        out_list = list(set(orig_df.columns.values) - set(empty_df.columns.values))
+        Form4Data._check_col_names(empty_df.columns.values, orig_df.columns.values)
+   
+        return
+    
+    
+    @staticmethod
+    def _check_col_names(column_list, columns):
+        """
+        This function checks if the code is reading new unknown column names, see _check_col_name
+        
+        column_list: list of standard column names
+        columns:     list of column names read
+        """
+
+        out_list = list(set(columns) - set(column_list))
         for coln in out_list:
             i = coln.lower()
             if ("footnote" not in i and "equityswap" not in i
@@ -134,6 +223,285 @@ class Form4Data:
         return cls(df)
     
     
+    @classmethod
+    def iter_csv(cls, input_file, columns=None, chunksize=100000, issuer_cik=None, owner_cik=None,
+                 transaction_code=None, date_from=None, date_to=None, date_col="transactionDate.value", typed=True):
+        """
+        This function reads a .csv database one chunk of rows at a time, so the file does not need to fit in memory.
+        All columns are read as text (CIKs keep their leading zeros, no dtype guessing per chunk), then
+        converted by typed_df. Rows are filtered in each chunk; empty chunks are not returned.
+        
+        input_file: Path obj, .csv file written by run_form4
+        columns:    list of column names to keep, default is all columns
+        chunksize:  int, number of rows read at a time
+        issuer_cik: string or list of strings, keep these issuers (leading zeros do not matter)
+        owner_cik:  string or list of strings, keep these reporting owners
+        transaction_code: string or list of strings, keep these transaction codes, e.g. ["P", "S"]
+        date_from:  string, YYYY-MM-DD, keep the rows with date_col on or after this date
+        date_to:    string, YYYY-MM-DD, keep the rows with date_col on or before this date
+        date_col:   string, column of the date range; rows without a date are dropped when a range is given
+        typed:      boolean, convert the date, number and flag columns, see set_dtypes
+        return:     generator of Form4Data obj
+        """
+        conditions = []
+        if issuer_cik is not None:
+            conditions.append(("issuerCik", _cik_set(issuer_cik)))
+        if owner_cik is not None:
+            conditions.append(("reportingOwnerId.rptOwnerCik", _cik_set(owner_cik)))
+        if transaction_code is not None:
+            codes = {transaction_code} if isinstance(transaction_code, str) else set(transaction_code)
+            conditions.append(("transactionCoding.transactionCode", codes))
+        
+        usecols = None
+        if columns is not None:
+            usecols = list(columns)
+            for coln in [c for c, _ in conditions] + ([date_col] if date_from or date_to else []):
+                if coln not in usecols:
+                    usecols.append(coln)
+        
+        for df in pd.read_csv(input_file, dtype=str, usecols=usecols, chunksize=chunksize):
+            keep = np.ones(len(df), dtype=bool)
+            for coln, values in conditions:
+                text = df[coln]
+                if coln != "transactionCoding.transactionCode":
+                    text = text.str.lstrip("0")
+                keep &= text.isin(values).to_numpy()
+            if date_from or date_to:
+                dates = df[date_col].str[:10]
+                if date_from:
+                    keep &= (dates >= date_from).to_numpy()
+                if date_to:
+                    keep &= (dates <= date_to).to_numpy()
+            if not keep.all():
+                df = df[keep]
+            if df.empty:
+                continue
+            
+            if columns is not None:
+                df = df[list(columns)]
+            if typed:
+                df = cls.typed_df(df)
+            yield cls(df.reset_index(drop=True))
+    
+    
+    @classmethod
+    def load_csv(cls, input_file, columns=None, chunksize=100000, compact=False, **filters):
+        """
+        This function reads the rows of a .csv database selected by filters, one chunk at a time, 
+        and keeps only these rows and columns in memory, see iter_csv
+        
+        input_file: Path obj, .csv file written by run_form4
+        columns:    list of column names to keep, default is all columns
+        chunksize:  int, number of rows read at a time
+        compact:    boolean, keep each chunk in the compact representation (see compact), all text columns
+                    categorical, so the full table is never held as strings
+        filters:    issuer_cik, owner_cik, transaction_code, date_from, date_to, date_col and typed of iter_csv
+        return:     Form4Data obj
+        """
+        chunks = [cls.compact_df(data.df, 1.0) if compact else data.df
+                  for data in cls.iter_csv(input_file, columns, chunksize, **filters)]
+        if chunks and compact:
+            return cls(_concat_categorical(chunks))
+        if chunks:
+            return cls(pd.concat(chunks, ignore_index=True))
+        
+        # no row selected: empty DataFrame with the same columns and types
+        df = pd.read_csv(input_file, dtype=str, nrows=0)
+        if columns is not None:
+            df = df[list(columns)]
+        if filters.get("typed", True):
+            df = cls.typed_df(df)
+        
+        return cls(df)
+    
+    
+    @classmethod
+    def from_normalized(cls, input_path, table_name, typed=False):
+        """
+        This function joins a fact table of the normalized output with the issuers and reportingOwners tables,
+        and returns the rows in the layout of the .csv database, in the order they were written
+        
+        input_path: Path obj, output directory of run_form4 with normalized=True
+        table_name: string, name of database, "nonDerivative" or "derivative"
+        typed:      boolean, convert the date, number and flag columns, see set_dtypes
+        """
+        from .normalize import read_dimension_csv
+        
+        input_path = Path(input_path)
+        facts   = read_dimension_csv(input_path / (table_name + "Fact.csv"))
+        issuers = read_dimension_csv(input_path / "issuers.csv")
+        owners  = read_dimension_csv(input_path / "reportingOwners.csv")
+        
+        df = facts.merge(issuers, on="issuerKey", how="left").merge(owners, on="ownerKey", how="left")
+        extra_col_name = [c for c in facts.columns if c not in cls.column_list(table_name + "Fact")]
+        df = df[cls.column_list(table_name) + extra_col_name]
+        if typed:
+            df = cls.typed_df(df)
+        
+        return cls(df)
+    
+    
+    @classmethod
+    def from_parquet(cls, input_path, table_name, columns=None, filters=None):
+        """
+        This function load data from the partitioned parquet output of run_form4
+        
+        input_path: Path obj, output directory of run_form4
+        table_name: string, name of database, "nonDerivative" or "derivative"
+        columns:    list of column names to read, default is all columns
+        filters:    list of (column, op, value) tuples, e.g. [("filing_year", "=", 2020)].
+                    Filters on filing_year and filing_quarter skip whole partitions
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("pyarrow is required to read parquet files")
+        
+        df = pd.read_parquet(Path(input_path) / table_name, columns=columns, filters=filters)
+        for coln in cls.date_col_name:
+            if coln in df.columns:
+                df[coln] = pd.to_datetime(df[coln])
+
+        return cls(df)
+
+
+    @classmethod
+    def from_sqlite(cls, input_file, table_name, where=None, params=()):
+        """
+        This function load data from the SQLite output of run_form4 (output_format="sqlite")
+
+        input_file: Path obj, location of form4.db
+        table_name: string, name of database, "nonDerivative" or "derivative"
+        where:      string, SQL condition, e.g. 'issuerCik = ?'. Conditions on issuerCik,
+                    "reportingOwnerId.rptOwnerCik", "transactionDate.value" and accessionNumber use an index
+        params:     tuple, values of the ? placeholders of where
+        """
+        import sqlite3
+
+        query = 'SELECT * FROM "%s"' % table_name
+        if where:
+            query += " WHERE " + where
+        conn = sqlite3.connect(input_file)
+        try:
+            df = pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+        for coln in cls.date_col_name:
+            if coln in df.columns:
+                df[coln] = pd.to_datetime(df[coln], format="%Y-%m-%d")
+        for coln in cls.bool_col_name:
+            if coln in df.columns:
+                df[coln] = df[coln].astype("boolean")
+
+        return cls(df)
+
+
+    def set_dtypes(self):
+        """
+        This function converts the date, number and flag columns of self.df from strings:
+        dates to datetime64, numbers to float, relationship flags (0/1/true/false) to boolean.
+        Values that cannot be read become missing values.
+        """
+        self.df = self.typed_df(self.df)
+        
+        return
+    
+    
+    @classmethod
+    def typed_df(cls, df):
+        """
+        This function returns a copy of df with the typed columns converted, see set_dtypes
+        
+        df:     pandas DataFrame
+        return: pandas DataFrame
+        """
+        df = df.copy()
+        for coln in cls.date_col_name:
+            if coln in df.columns:
+                # dates may have a timezone suffix, e.g. 2020-11-27-05:00
+                text = df[coln].astype("string").str.strip().str[:10]
+                df[coln] = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+        for coln in cls.float_col_name:
+            if coln in df.columns:
+                df[coln] = pd.to_numeric(df[coln].astype("string").str.strip(), errors="coerce").astype("float64")
+        for coln in cls.bool_col_name:
+            if coln in df.columns:
+                text = df[coln].astype("string").str.strip().str.lower()
+                df[coln] = text.map(cls._bool_values).astype("boolean")
+        
+        return df
+    
+    
+    _bool_values = {"1": True, "0": False, "true": True, "false": False, "1.0": True, "0.0": False}
+    
+    # named patterns of classify_footnotes, column name -> regular expression (case insensitive)
+    footnote_patterns = {
+        "has_10b5": r"10b5|10b-5",
+        "has_gift": r"\bgift",
+        "has_tax_withholding": r"withh[eo]ld|\btax(?:es)? (?:withholding|obligations?|liabilit)",
+        "has_option_exercise": r"\bexercis\w* (?:of )?(?:\w+ ){0,3}options?\b|\boptions? (?:was |were )?exercis",
+        "has_weighted_average": r"weighted[ -]average",
+        "has_trust": r"\btrust",
+        "has_indirect": r"\bindirect|disclaims? beneficial ownership",
+        }
+    
+    
+    def compact(self, max_unique_ratio=0.5):
+        """
+        This function converts self.df to a compact representation and returns the memory saved.
+        Date, number and flag columns get their types (see set_dtypes). The issuer and owner names, addresses,
+        security titles and footnote texts (category_col_name) always become categorical, as do the other text
+        columns with repeated values: each distinct text is stored once and rows keep a small integer code.
+        Column access, add_has_10b5 and classify_footnotes work the same on the compact DataFrame.
+        
+        max_unique_ratio: float, a text column not in category_col_name is kept as strings when its number
+                          of distinct values is above this fraction of the rows
+        return:           dict, "before" and "after" (bytes), and "columns", column -> {"before", "after", "dtype"}
+        """
+        before = self.memory_usage()
+        self.df = self.compact_df(self.df, max_unique_ratio)
+        after = self.memory_usage()
+        
+        return {
+            "before": sum(before.values()),
+            "after": sum(after.values()),
+            "columns": {coln: {"before": before[coln], "after": after[coln], "dtype": str(self.df[coln].dtype)}
+                        for coln in self.df.columns},
+            }
+    
+    
+    @classmethod
+    def compact_df(cls, df, max_unique_ratio=0.5):
+        """
+        This function returns a compact copy of df, see compact
+        
+        df:               pandas DataFrame
+        max_unique_ratio: float, see compact
+        return:           pandas DataFrame
+        """
+        typed_cols = [coln for coln in df.columns
+                      if df[coln].dtype == object and coln in cls.date_col_name + cls.float_col_name + cls.bool_col_name]
+        df = df.copy()
+        if typed_cols:
+            df[typed_cols] = cls.typed_df(df[typed_cols])
+        for coln in df.columns:
+            if df[coln].dtype == object and (coln in cls.category_col_name
+                                             or df[coln].nunique() <= max_unique_ratio * len(df)):
+                df[coln] = df[coln].astype("category")
+        
+        return df
+    
+    
+    def memory_usage(self):
+        """
+        This function returns the memory used by each column of self.df, including the strings
+        
+        return: dict, column -> bytes
+        """
+        
+        return self.df.memory_usage(index=False, deep=True).to_dict()
+    
+    
     def check_10b5(self, text):
         """
         This function checks if 10b5 is mentioned in the footnote text.
@@ -144,10 +512,176 @@ class Form4Data:
     
     
     def add_has_10b5(self):
-        tmp = self.df['footnote'].apply(self.check_10b5)
-        tmp.name = "has_10b5"
-        self.df = pd.concat([self.df, tmp], axis=1)
+        """
+        This function adds a column has_10b5, True if the footnote text contains 10b5, see check_10b5
+        """
+        self.classify_footnotes({"has_10b5": re.escape("10b5")}, flags=0)
         
         return
+    
+    
+    def classify_footnotes(self, patterns=None, flags=re.IGNORECASE, cache=None):
+        """
+        This function adds one True/False column per named pattern, True when the footnote text matches it.
+        All the patterns are searched together, in one scan of each distinct footnote text;
+        rows with the same footnote share the result.
+        
+        patterns: dict, column name -> regular expression, default is footnote_patterns
+        flags:    int, flags of the regular expressions, default is re.IGNORECASE
+        cache:    dict, footnote text -> flags, kept between calls, e.g. for the chunks of a .csv file
+        """
+        if patterns is None:
+            patterns = self.footnote_patterns
+        
+        result = footnote_flags(self.df['footnote'], patterns, flags, cache)
+        for i, name in enumerate(patterns):
+            self.df[name] = result[:, i]
+        
+        return
+    
+    
+    @classmethod
+    def classify_footnotes_csv(cls, input_file, output_file, patterns=None, flags=re.IGNORECASE, chunksize=100000):
+        """
+        This function adds the classify_footnotes columns to a .csv database, one chunk of rows at a time
+        
+        input_file:  Path obj, .csv file written by run_form4
+        output_file: Path obj, .csv file written with the new columns
+        patterns:    dict, column name -> regular expression, default is footnote_patterns
+        flags:       int, flags of the regular expressions
+        chunksize:   int, number of rows read at a time
+        """
+        cache = {}
+        mode  = 'w'
+        for chunk in pd.read_csv(input_file, dtype=str, chunksize=chunksize):
+            data = cls(chunk)
+            data.classify_footnotes(patterns, flags, cache)
+            data.df.to_csv(output_file, mode=mode, index=False, header=(mode == 'w'))
+            mode = 'a'
+        
+        return
+
+
+def _cik_set(cik):
+    """
+    This function returns the CIKs without leading zeros, to compare with the text of the .csv file
+    """
+    if isinstance(cik, (str, int)):
+        cik = [cik]
+    
+    return {str(c).lstrip("0") for c in cik}
+
+
+def _concat_categorical(chunks):
+    """
+    This function concatenates DataFrames whose categorical columns have different categories,
+    the categories of each column are merged first so the result stays categorical
+    """
+    for coln in chunks[0].columns:
+        if isinstance(chunks[0][coln].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([chunk[coln] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[coln] = chunk[coln].cat.set_categories(categories)
+    
+    return pd.concat(chunks, ignore_index=True)
+
+
+def footnote_flags(texts, patterns, flags=re.IGNORECASE, cache=None):
+    """
+    This function searches named patterns in a column of footnote texts.
+    The patterns are combined into one regular expression of lookaheads, so each distinct text is scanned once;
+    at each position where a pattern matches, the patterns not found yet are tried at that position only.
+    Patterns with capturing groups (their backreferences would be renumbered) are searched one by one,
+    as are all the patterns when the combined expression does not compile.
+    
+    texts:    pandas Series of strings (missing values never match)
+    patterns: dict, column name -> regular expression
+    flags:    int, flags of the regular expressions
+    cache:    dict, text -> tuple of booleans, filled and reused
+    return:   numpy array of booleans, one row per text and one column per pattern
+    """
+    
+    singles  = [re.compile(p, flags) for p in patterns.values()]
+    combined = _combine_patterns(list(patterns.values()), singles, flags)
+    n        = len(singles)
+    
+    # code -1 (missing text) points to the last row, all False
+    if isinstance(texts.dtype, pd.CategoricalDtype):
+        # compact DataFrame, the distinct texts are already pooled
+        codes, uniques = texts.cat.codes.to_numpy(), texts.cat.categories
+    else:
+        codes, uniques = pd.factorize(texts)
+    result = np.zeros((len(uniques) + 1, n), dtype=bool)
+    
+    for j, text in enumerate(uniques):
+        if not isinstance(text, str):
+            continue
+        found = cache.get(text) if cache is not None else None
+        if found is None:
+            found = _search_all(combined, singles, text)
+            if cache is not None:
+                if len(cache) >= 1000000:
+                    cache.clear()
+                cache[text] = found
+        result[j] = found
+    
+    return result[codes]
+
+
+# global inline flags at the start of a pattern, e.g. (?i)
+_inline_flags = re.compile(r"\(\?([aiLmsux]+)\)")
+
+
+def _combine_patterns(patterns, singles, flags):
+    """
+    This function returns (combined regular expression or None, indexes of the patterns it finds,
+    indexes of the patterns searched one by one)
+    """
+    
+    parts    = []
+    together = []
+    alone    = []
+    for k, (pattern, single) in enumerate(zip(patterns, singles)):
+        if single.groups:
+            alone.append(k)
+            continue
+        # (?i)gift becomes (?i:gift): global flags are only allowed at the start of the combined expression
+        scoped = ""
+        match  = _inline_flags.match(pattern)
+        while match:
+            scoped += match.group(1)
+            pattern = pattern[match.end():]
+            match   = _inline_flags.match(pattern)
+        if scoped:
+            pattern = "(?%s:%s)" % (scoped, pattern)
+        parts.append("(?=(?:%s))" % pattern)
+        together.append(k)
+    
+    if not parts:
+        return None, [], alone
+    try:
+        return re.compile("|".join(parts), flags), together, alone
+    except re.error:
+        return None, [], list(range(len(patterns)))
+
+
+def _search_all(combined, singles, text):
+    combined, together, alone = combined
+    found = [False] * len(singles)
+    for k in alone:
+        found[k] = singles[k].search(text) is not None
+    
+    left = len(together)
+    if left:
+        for match in combined.finditer(text):
+            pos = match.start()
+            for k in together:
+                if not found[k] and singles[k].match(text, pos):
+                    found[k] = True
+                    left -= 1
+            if not left:
+                break
+    
+    return tuple(found)
         
 
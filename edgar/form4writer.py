@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+
+
+import os
+import re
+import sqlite3
+import uuid
+import pandas as pd
+from pathlib import Path
+from .form4data import Form4Data
+
+
+class Form4Writer:
+    """
+    Create a class for buffered writing of the .csv database
+
+    Rows are kept in memory and written to the .csv files in large batches,
+    with one DataFrame per file and batch.
+    Files are opened on first use and kept open until close().
+    Append if file already exists, same as save_df_to_csv.
+    After each write, the size of the file, which ends with a complete row, is saved in <table_name>.csv.offset.
+    When a file opened again is larger, only the bytes after that size are scanned, and a partial last row
+    left by an interrupted run is removed; complete rows appended by another writer are kept.
+
+    self.output_path: Path obj, directory for output files
+    self.max_rows:    int, flush when this many rows are buffered
+    self.max_bytes:   int, flush when the buffered text is about this size
+    self.extra_col_name: list of column names added after the Form4Data columns, e.g. Form4Data.header_col_name
+    self.on_flush:    function called after each flush, once the rows are written
+
+    """
+
+    def __init__(self, output_path, max_rows=10000, max_bytes=16 * 2**20, extra_col_name=None):
+        self.output_path = Path(output_path)
+        self.max_rows    = max_rows
+        self.max_bytes   = max_bytes
+        self.extra_col_name = list(extra_col_name or [])
+        self.n_rows      = 0
+        self.n_bytes     = 0
+        self.on_flush    = None
+        self._files      = {}
+        self._columns    = {}
+        self._buffer     = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # rows of a filing are added after it is fully parsed, so the buffer is always safe to write
+        self.close()
+        return False
+
+
+    def add(self, table_name, rows):
+        """
+        This function adds rows to the buffer of a table
+
+        table_name: string, name of database, "nonDerivative" or "derivative"
+        rows:       list of tuples, in the column order of Form4Data.column_list, followed by extra_col_name
+                    (except for the dimension tables of the normalized output)
+        """
+
+        self._add(table_name, rows)
+        if self.n_rows >= self.max_rows or self.n_bytes >= self.max_bytes:
+            self.flush()
+
+        return
+
+
+    def add_filing(self, tables):
+        """
+        This function adds all the rows of a filing. The buffer is only written after the whole filing is added,
+        so the rows of a filing are never split between two flushes.
+
+        tables: list of (table_name, list of rows), see add
+        """
+
+        for table_name, rows in tables:
+            self._add(table_name, rows)
+        if self.n_rows >= self.max_rows or self.n_bytes >= self.max_bytes:
+            self.flush()
+
+        return
+
+
+    def _add(self, table_name, rows):
+        if table_name not in self._buffer:
+            self._columns[table_name] = Form4Data.column_list(table_name)
+            if table_name not in Form4Data.dimension_table_name:
+                self._columns[table_name] += self.extra_col_name
+            self._buffer[table_name]  = []
+            self._open(table_name)
+
+        self._buffer[table_name] += rows
+        self.n_rows  += len(rows)
+        self.n_bytes += sum(len(v) + 1 for row in rows for v in row if isinstance(v, str))
+
+        return
+
+
+    def flush(self):
+        """
+        This function writes all buffered rows
+        """
+
+        for table_name, rows in self._buffer.items():
+            if not rows:
+                continue
+            self._write_rows(table_name, pd.DataFrame(rows, columns=self._columns[table_name]))
+            self._buffer[table_name] = []
+
+        self.n_rows  = 0
+        self.n_bytes = 0
+
+        if self.on_flush is not None:
+            self.on_flush()
+
+        return
+
+
+    def close(self):
+        """
+        This function flushes the buffer and closes all files
+        """
+
+        try:
+            self.flush()
+        finally:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+        return
+
+
+    def _open(self, table_name):
+        """
+        This function opens a .csv file for appending, and writes the header if the file is new.
+        An existing file must have the same columns. A partial last row, left by an interrupted run, is removed.
+        """
+
+        fileloc = self.output_path / (table_name + ".csv")
+        header  = pd.DataFrame(columns=self._columns[table_name]).to_csv(index=False)
+        f = open(fileloc, 'a+', newline='', encoding='utf-8')
+
+        size = f.seek(0, os.SEEK_END)
+        if size > 0:
+            f.seek(0)
+            if f.readline() != header:
+                f.close()
+                raise ValueError("Columns of " + str(fileloc) + " differ from the rows to write")
+            start = self._read_offset(table_name)
+            if start is None or start > size:
+                # no offset saved for this file, or the file was replaced: scan it all
+                start = 0
+            end = _last_row_end(fileloc, start) if start < size else size
+            if end < size:
+                print("Warning: removing partial last row of " + str(fileloc))
+                f.truncate(end)
+            f.seek(0, os.SEEK_END)
+            if start != end:
+                self._save_offset(table_name, end)
+        self._files[table_name] = f
+
+        if f.tell() == 0:
+            self._write(table_name, header)
+
+        return
+
+
+    def _write_rows(self, table_name, df):
+        """
+        This function writes a batch of rows with a single write of complete rows;
+        if the write fails, the file is truncated back to its last complete row.
+        """
+
+        self._write(table_name, df.to_csv(index=False, header=False))
+
+        return
+
+
+    def _write(self, table_name, text):
+        f   = self._files[table_name]
+        pos = f.tell()
+        try:
+            f.write(text)
+            f.flush()
+        except BaseException:
+            f.truncate(pos)
+            raise
+        self._save_offset(table_name, f.tell())
+
+        return
+
+
+    def _read_offset(self, table_name):
+        try:
+            return int((self.output_path / (table_name + ".csv.offset")).read_text())
+        except (OSError, ValueError):
+            return None
+
+
+    def _save_offset(self, table_name, offset):
+        fileloc = self.output_path / (table_name + ".csv.offset")
+        tmp     = fileloc.with_suffix(".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, fileloc)
+
+        return
+
+
+class Form4ParquetWriter(Form4Writer):
+    """
+    Create a class for buffered writing of the database as typed parquet files
+
+    Each table is a directory output_path/<table_name>, partitioned by the filing date of the filing:
+    <table_name>/filing_year=2020/filing_quarter=4/<part>.parquet (0 when the date is unknown). Each flush adds new part files,
+    existing files are never changed. Dates are stored as dates, numbers as floats, relationship flags
+    as booleans and all other columns as strings (see Form4Data.typed_df).
+    Rows must end with the Form4Data.header_col_name columns, which give the partition.
+
+    """
+
+    partition_col_name = ["filing_year", "filing_quarter"]
+
+    def __init__(self, output_path, max_rows=100000, max_bytes=64 * 2**20, extra_col_name=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("pyarrow is required for parquet output")
+
+        extra_col_name = list(extra_col_name or Form4Data.header_col_name)
+        if "filingDate" not in extra_col_name:
+            raise ValueError("parquet output needs the filingDate column")
+
+        super().__init__(output_path, max_rows, max_bytes, extra_col_name)
+        self._run_id = uuid.uuid4().hex[:12]
+        self._n_part = 0
+
+
+    def _open(self, table_name):
+        (self.output_path / table_name).mkdir(parents=True, exist_ok=True)
+
+        return
+
+
+    def _write_rows(self, table_name, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # filings without a filing date go to filing_year=0/filing_quarter=0
+        df = Form4Data.typed_df(df)
+        df["filing_year"]    = df["filingDate"].dt.year.fillna(0).astype("int32")
+        df["filing_quarter"] = df["filingDate"].dt.quarter.fillna(0).astype("int32")
+
+        table = pa.Table.from_pandas(df, schema=self.schema(df.columns), preserve_index=False)
+        pq.write_to_dataset(table, self.output_path / table_name, partition_cols=self.partition_col_name,
+                            basename_template="part-" + self._run_id + "-" + str(self._n_part) + "-{i}.parquet",
+                            existing_data_behavior="overwrite_or_ignore")
+        self._n_part += 1
+
+        return
+
+
+    @classmethod
+    def schema(cls, columns):
+        """
+        This function returns the pyarrow schema of a table
+
+        columns: list of column names
+        return:  pyarrow Schema
+        """
+        import pyarrow as pa
+
+        fields = []
+        for coln in columns:
+            if coln in Form4Data.date_col_name:
+                fields.append(pa.field(coln, pa.date32()))
+            elif coln in Form4Data.float_col_name:
+                fields.append(pa.field(coln, pa.float64()))
+            elif coln in Form4Data.bool_col_name:
+                fields.append(pa.field(coln, pa.bool_()))
+            elif coln in cls.partition_col_name:
+                fields.append(pa.field(coln, pa.int32()))
+            else:
+                fields.append(pa.field(coln, pa.string()))
+
+        return pa.schema(fields)
+
+
+class Form4SQLiteWriter(Form4Writer):
+    """
+    Create a class for buffered writing of the database to a SQLite file
+
+    Tables nonDerivative and derivative of output_path/form4.db have typed columns: dates as ISO text
+    (YYYY-MM-DD), numbers as REAL, relationship flags as INTEGER 0/1 and all other columns as TEXT
+    (see Form4Data.typed_df). Each flush is one transaction with one bulk insert per table.
+    Rows must end with the Form4Data.header_col_name columns. The first time an accession number is
+    written in a run, its rows from earlier runs are deleted in the same transaction, so a filing
+    processed again replaces its rows instead of adding them twice.
+    The database uses WAL mode, readers are not blocked while a run writes.
+
+    """
+
+    table_names  = ["nonDerivative", "derivative"]
+    # indexed columns, for lookups by issuer, reporting owner, transaction date and filing
+    index_col_name = ["issuerCik", "reportingOwnerId.rptOwnerCik", "transactionDate.value", "accessionNumber"]
+
+    def __init__(self, output_path, max_rows=100000, max_bytes=64 * 2**20, extra_col_name=None, database="form4.db"):
+        extra_col_name = list(extra_col_name or Form4Data.header_col_name)
+        if "accessionNumber" not in extra_col_name:
+            raise ValueError("sqlite output needs the accessionNumber column")
+
+        super().__init__(output_path, max_rows, max_bytes, extra_col_name)
+        self.database  = self.output_path / database
+        self._replaced = set()
+        self._conn     = sqlite3.connect(self.database)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        # all tables exist from the start, a filing processed again is removed from each of them
+        with self._conn:
+            for table_name in self.table_names:
+                self._columns[table_name] = Form4Data.column_list(table_name) + self.extra_col_name
+                self._conn.execute(self.create_table_sql(table_name, self._columns[table_name]))
+                for coln in self.index_col_name:
+                    self._conn.execute('CREATE INDEX IF NOT EXISTS "%s_%s" ON "%s" ("%s")'
+                                       % (table_name, coln, table_name, coln))
+
+
+    def flush(self):
+        """
+        This function writes all buffered rows in a single transaction
+        """
+
+        accessions = set()
+        for table_name, rows in self._buffer.items():
+            i = self._columns[table_name].index("accessionNumber")
+            accessions.update(row[i] for row in rows)
+        accessions -= self._replaced
+
+        with self._conn:
+            deleted = sorted(accessions)
+            for table_name in self.table_names:
+                # stay below the limit on the number of parameters of a statement
+                for j in range(0, len(deleted), 500):
+                    part = deleted[j:j + 500]
+                    self._conn.execute('DELETE FROM "%s" WHERE accessionNumber IN (%s)'
+                                       % (table_name, ",".join("?" * len(part))), part)
+            for table_name, rows in self._buffer.items():
+                if not rows:
+                    continue
+                columns = self._columns[table_name]
+                df = pd.DataFrame(rows, columns=columns)
+                self._conn.executemany('INSERT INTO "%s" VALUES (%s)' % (table_name, ",".join("?" * len(columns))),
+                                       self.sql_rows(df))
+
+        self._replaced |= accessions
+        for table_name in self._buffer:
+            self._buffer[table_name] = []
+        self.n_rows  = 0
+        self.n_bytes = 0
+
+        if self.on_flush is not None:
+            self.on_flush()
+
+        return
+
+
+    def close(self):
+        """
+        This function flushes the buffer and closes the database
+        """
+
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+
+        return
+
+
+    def _open(self, table_name):
+        if table_name not in self.table_names:
+            raise ValueError("sqlite output has no table " + str(table_name))
+
+        return
+
+
+    @staticmethod
+    def sql_rows(df):
+        """
+        This function converts a batch of rows to the values stored in SQLite
+
+        df:     pandas DataFrame, text columns as returned by the parser
+        return: list of tuples, missing values are None
+        """
+
+        df = Form4Data.typed_df(df)
+        for coln in Form4Data.date_col_name:
+            if coln in df.columns:
+                df[coln] = df[coln].dt.strftime("%Y-%m-%d")
+        for coln in Form4Data.bool_col_name:
+            if coln in df.columns:
+                df[coln] = df[coln].astype("Int64")
+        df = df.astype(object).where(df.notna(), None)
+
+        return list(df.itertuples(index=False, name=None))
+
+
+    @staticmethod
+    def create_table_sql(table_name, columns):
+        """
+        This function returns the CREATE TABLE statement of a table
+
+        table_name: string
+        columns:    list of column names
+        return:     string
+        """
+
+        fields = []
+        for coln in columns:
+            if coln in Form4Data.float_col_name:
+                fields.append('"%s" REAL' % coln)
+            elif coln in Form4Data.bool_col_name:
+                fields.append('"%s" INTEGER' % coln)
+            else:
+                fields.append('"%s" TEXT' % coln)
+
+        return 'CREATE TABLE IF NOT EXISTS "%s" (%s)' % (table_name, ", ".join(fields))
+
+
+def _last_row_end(fileloc, start=0, chunk_size=2**20):
+    """
+    This function returns the size of a .csv file up to its last complete row: the last line ending
+    outside of a quoted value, as footnotes may hold line endings
+
+    fileloc: Path obj, .csv file
+    start:   int, offset in bytes of the end of a complete row, where the scan starts
+    return:  int, offset in bytes, start when no row is complete after it
+    """
+
+    end     = start
+    pos     = start
+    quoted  = False
+    special = re.compile(rb'["\n]')
+    with open(fileloc, 'rb') as f:
+        f.seek(start)
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            for match in special.finditer(chunk):
+                if match.group() == b'"':
+                    quoted = not quoted
+                elif not quoted:
+                    end = pos + match.end()
+            pos += len(chunk)
+
+    return end
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+
+# version of the rows produced by the parser; filings processed by another version are processed again
+PARSER_VERSION = "1"
+
+
+class Form4Manifest:
+    """
+    Create a class for the manifest of processed filings, saved as manifest.jsonl in the output directory
+
+    Each line of the file is one processed filing: accession number, filename, file size, mtime,
+    sha1 of the content, rows written per table, parser version and output (format and csv options).
+    The last line of an accession and output wins.
+    A filing is skipped when it was written to the same output and its size and mtime are unchanged
+    (one stat call), or its content hash is unchanged. Archive members, already in memory, are compared
+    by content hash. A filing written as csv is not skipped by a sqlite run into the same directory.
+
+    self.fileloc: Path obj, location of manifest.jsonl
+    self.output:  dict, output of this run: "format", and "header_cols" and "normalized" for csv
+    self.entries: dict, (output, accession) -> entry of the last processing
+
+    """
+
+    filename = "manifest.jsonl"
+
+    def __init__(self, output_path, output_format="csv", header_cols=False, normalized=False):
+        self.fileloc  = Path(output_path) / self.filename
+        self.output   = {"format": output_format}
+        if output_format == "csv":
+            self.output.update(header_cols=bool(header_cols), normalized=bool(normalized))
+        self.entries  = {}
+        self._pending = []
+        self._signatures = {}
+
+        n_lines = 0
+        if self.fileloc.is_file():
+            with open(self.fileloc, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # partial last line of an interrupted run
+                        continue
+                    self.entries[_entry_key(entry)] = entry
+                    n_lines += 1
+
+        # rewrite the file when most of its lines are outdated
+        if n_lines > 2 * len(self.entries) + 1000:
+            self._rewrite()
+
+
+    def filter(self, input_path, items, report):
+        """
+        This function skips the filings already processed, and the filings whose accession number is already
+        being processed and not yet committed, e.g. two archive members a/X.txt and b/X.txt
+
+        input_path: Path obj, directory for input files
+        items:      iterable of (filename, bytes content or None), see list_form4inputs
+        report:     dict, filenames are appended to its "skipped", "duplicate" and "changed" lists, and to its
+                    "stale" list when the old rows of a changed filing stay in the output (csv and parquet)
+        return:     generator of the items to process
+        """
+
+        output = json.dumps(self.output, sort_keys=True)
+        for item in items:
+            filename, data = item
+            accession = accession_number(filename)
+            if accession in self._signatures:
+                report["duplicate"].append(filename)
+                continue
+            entry = self.entries.get((output, accession))
+
+            if data is None:
+                fileloc  = Path(input_path) / filename
+                stat     = os.stat(fileloc)
+                size     = stat.st_size
+                mtime_ns = stat.st_mtime_ns
+            else:
+                # archive member, no mtime of its own
+                size     = len(data)
+                mtime_ns = None
+
+            if entry is not None and entry["parser_version"] == PARSER_VERSION:
+                if mtime_ns is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+                    report["skipped"].append(filename)
+                    continue
+                sha1 = file_sha1(fileloc) if data is None else hashlib.sha1(data).hexdigest()
+                if entry["sha1"] == sha1:
+                    # same content, remember the new size and mtime for the next run
+                    if mtime_ns is not None:
+                        self._pending.append(dict(entry, size=size, mtime_ns=mtime_ns))
+                    report["skipped"].append(filename)
+                    continue
+            else:
+                sha1 = file_sha1(fileloc) if data is None else hashlib.sha1(data).hexdigest()
+
+            if entry is not None:
+                report["changed"].append(filename)
+                # only sqlite replaces the rows of an accession number
+                if self.output["format"] != "sqlite":
+                    report["stale"].append(filename)
+            # kept until the filing is committed
+            self._signatures[accession] = (size, mtime_ns, sha1)
+            yield item
+
+
+    def add(self, filename, tables):
+        """
+        This function records a processed filing. It is saved by the next commit()
+
+        filename: string, full filename of Form-4.txt file, as given by filter()
+        tables:   list of (name of database, list of rows) of the filing
+        """
+
+        size, mtime_ns, sha1 = self._signatures[accession_number(filename)]
+        rows = {}
+        for table_name, records in tables:
+            rows[table_name] = rows.get(table_name, 0) + len(records)
+
+        self._pending.append({
+            "accession": accession_number(filename),
+            "filename": filename,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha1": sha1,
+            "rows": rows,
+            "parser_version": PARSER_VERSION,
+            "output": self.output,
+            })
+
+        return
+
+
+    def commit(self):
+        """
+        This function appends the recorded filings to manifest.jsonl.
+        Called after their rows are written to the output files.
+        """
+
+        if not self._pending:
+            return
+
+        with open(self.fileloc, 'a') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in self._pending))
+        for entry in self._pending:
+            self.entries[_entry_key(entry)] = entry
+            self._signatures.pop(entry["accession"], None)
+        self._pending = []
+
+        return
+
+
+    def _rewrite(self):
+        tmp = self.fileloc.with_suffix(".tmp")
+        with open(tmp, 'w') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in self.entries.values()))
+        os.replace(tmp, self.fileloc)
+
+        return
+
+
+def _entry_key(entry):
+    # entries written before the output was recorded come from csv runs without options
+    output = entry.get("output", {"format": "csv", "header_cols": False, "normalized": False})
+
+    return json.dumps(output, sort_keys=True), entry["accession"]
+
+
+def accession_number(filename):
+    """
+    This function reads the accession number from a filename such as 1023844_1_0001437749-20-000181.txt
+
+    filename: string
+    return:   string, accession number, or the filename if it has none
+    """
+
+    match = re.search(r'\d{10}-\d{2}-\d{6}', filename)
+
+    return match.group(0) if match else filename
+
+
+def file_sha1(fileloc):
+    """
+    This function returns the sha1 hex digest of a file content
+    """
+
+    with open(fileloc, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+
+import heapq
+from collections import deque
+
+
+class Form4Metrics:
+    """
+    Create a class for the timers and counters of a run
+
+    Worker processes fill their own Form4Metrics, merged into the one of run_form4.
+
+    self.stages:   dict, stage -> cumulative seconds, e.g. "read", "parse_xml", "records", "write"
+    self.counters: dict, "files", "bytes", "owners", "footnotes" and "rows.<name of database>"
+    self.top_n:    int, number of slowest filings kept
+    self.slowest:  list of (seconds, filename), the top_n slowest filings to parse
+    self.latency:  dict, "files", "sum" and "max" of the seconds from file arrival to rows written (watch mode)
+    self.recent_latency: deque, the last 10000 latencies, for the percentiles
+
+    """
+
+    def __init__(self, top_n=10):
+        self.stages   = {}
+        self.counters = {"files": 0, "bytes": 0, "owners": 0, "footnotes": 0}
+        self.top_n    = top_n
+        self.slowest  = []
+        self.latency  = {"files": 0, "sum": 0.0, "max": 0.0}
+        self.recent_latency = deque(maxlen=10000)
+
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+    def add_count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def add_file(self, filename, n_bytes, seconds, tables):
+        """
+        This function counts a parsed filing
+
+        filename: string
+        n_bytes:  int, size of the file
+        seconds:  float, time to read and parse the file
+        tables:   list of (name of database, list of rows) of the filing
+        """
+
+        self.counters["files"] += 1
+        self.counters["bytes"] += n_bytes
+        for table_name, records in tables:
+            self.add_count("rows." + table_name, len(records))
+        self._push_slowest((seconds, filename))
+
+
+    def add_latency(self, seconds):
+        """
+        This function counts the time between the arrival of a file and the write of its rows
+        """
+
+        self.latency["files"] += 1
+        self.latency["sum"]   += seconds
+        self.latency["max"]    = max(self.latency["max"], seconds)
+        self.recent_latency.append(seconds)
+
+
+    def latency_dict(self):
+        """
+        This function returns the latency statistics: count, mean, max, and median and 95th percentile
+        of the last 10000 files
+        """
+
+        n = self.latency["files"]
+        if not n:
+            return {"files": 0}
+        recent = sorted(self.recent_latency)
+
+        return {
+            "files": n,
+            "mean": self.latency["sum"] / n,
+            "p50": recent[len(recent) // 2],
+            "p95": recent[min(len(recent) - 1, int(0.95 * len(recent)))],
+            "max": self.latency["max"],
+            }
+
+
+    def merge(self, other):
+        """
+        This function adds the timers and counters of another Form4Metrics obj, e.g. from a worker process
+        """
+
+        for stage, seconds in other.stages.items():
+            self.add_time(stage, seconds)
+        for name, n in other.counters.items():
+            self.add_count(name, n)
+        for item in other.slowest:
+            self._push_slowest(item)
+        self.latency["files"] += other.latency["files"]
+        self.latency["sum"]   += other.latency["sum"]
+        self.latency["max"]    = max(self.latency["max"], other.latency["max"])
+        self.recent_latency.extend(other.recent_latency)
+
+
+    def to_dict(self, seconds=None):
+        """
+        This function returns the metrics as a dictionary that can be saved as json
+
+        seconds: float, wall time of the run
+        return:  dict
+        """
+
+        result = {
+            "stages": dict(self.stages),
+            "counters": dict(self.counters),
+            "slowest": [{"filename": filename, "seconds": s} for s, filename in sorted(self.slowest, reverse=True)],
+            }
+        if self.latency["files"]:
+            result["latency"] = self.latency_dict()
+        if seconds is not None:
+            result["seconds"] = seconds
+            result["files_per_s"] = self.counters["files"] / seconds if seconds > 0 else 0.0
+
+        return result
+
+
+    def summary(self, seconds=None):
+        """
+        This function returns the metrics as lines of text
+        """
+
+        lines = []
+        if seconds is not None:
+            lines.append("Processed %d files (%.1f MB) in %.2f s, %.1f files/s"
+                         % (self.counters["files"], self.counters["bytes"] / 2**20, seconds,
+                            self.counters["files"] / seconds if seconds > 0 else 0.0))
+        lines.append("Counters: " + ", ".join("%s=%d" % item for item in self.counters.items()))
+        total = sum(self.stages.values())
+        for stage, s in self.stages.items():
+            lines.append("  %-14s %9.3f s %5.1f%%" % (stage, s, 100 * s / total if total else 0.0))
+        if self.latency["files"]:
+            lines.append("Latency: mean %(mean).3f s, p50 %(p50).3f s, p95 %(p95).3f s, max %(max).3f s" % self.latency_dict())
+        if self.slowest:
+            lines.append("Slowest files:")
+            for s, filename in sorted(self.slowest, reverse=True):
+                lines.append("  %9.4f s  %s" % (s, filename))
+
+        return "\n".join(lines)
+
+
+    def _push_slowest(self, item):
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
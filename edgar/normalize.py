@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+
+import pandas as pd
+from pathlib import Path
+from .form4data import Form4Data
+
+
+class Form4Normalizer:
+    """
+    Create a class for splitting the rows of the .csv database into dimension and fact tables
+
+    Each distinct issuer (issuerCik, issuerName, issuerTradingSymbol) and each distinct reporting owner
+    (the 14 reporting owner columns) gets a key, written once to issuers.csv or reportingOwners.csv.
+    The key is the CIK followed by a version number, e.g. "0001023844-1"; a new version is added when
+    the name, address or relationship of the same CIK differs from the versions already seen.
+    Fact tables nonDerivativeFact.csv and derivativeFact.csv keep the transaction columns and the two keys.
+    Keys already in the output directory are reused, so a later run appends only new versions.
+
+    self.issuer_keys: dict, issuer columns -> key
+    self.owner_keys:  dict, reporting owner columns -> key
+
+    """
+
+    def __init__(self, output_path):
+        self.issuer_keys = {}
+        self.owner_keys  = {}
+        self._versions   = {"issuers": {}, "reportingOwners": {}}
+
+        for table_name, keys in (("issuers", self.issuer_keys), ("reportingOwners", self.owner_keys)):
+            fileloc = Path(output_path) / (table_name + ".csv")
+            if fileloc.is_file():
+                df = read_dimension_csv(fileloc)
+                for row in df.itertuples(index=False, name=None):
+                    keys[row[1:]] = row[0]
+                    self._add_version(table_name, row[1], int(row[0].rpartition("-")[2]))
+
+
+    def split(self, table_name, rows):
+        """
+        This function splits the rows of a table of the .csv database
+
+        table_name: string, "nonDerivative" or "derivative"
+        rows:       list of tuples, in the column order of Form4Data.column_list, followed by any extra columns
+        return:     list of (table name, list of rows): new rows of issuers and reportingOwners, then the fact rows
+        """
+
+        n_issuer = len(Form4Data.issuer_col_name)
+        n_fixed  = n_issuer + len(Form4Data.reporting_col_name)
+
+        new_issuers = []
+        new_owners  = []
+        facts       = []
+        for row in rows:
+            issuer = row[:n_issuer]
+            issuer_key = self.issuer_keys.get(issuer)
+            if issuer_key is None:
+                issuer_key = self._new_key("issuers", issuer, self.issuer_keys)
+                new_issuers.append((issuer_key,) + issuer)
+
+            owner = row[n_issuer:n_fixed]
+            owner_key = self.owner_keys.get(owner)
+            if owner_key is None:
+                owner_key = self._new_key("reportingOwners", owner, self.owner_keys)
+                new_owners.append((owner_key,) + owner)
+
+            facts.append((issuer_key, owner_key) + row[n_fixed:])
+
+        tables = []
+        if new_issuers:
+            tables.append(("issuers", new_issuers))
+        if new_owners:
+            tables.append(("reportingOwners", new_owners))
+        tables.append((table_name + "Fact", facts))
+
+        return tables
+
+
+    def _new_key(self, table_name, values, keys):
+        cik = values[0] or ""
+        version = self._versions[table_name].get(cik, 0) + 1
+        self._add_version(table_name, cik, version)
+        keys[values] = cik + "-" + str(version)
+
+        return keys[values]
+
+
+    def _add_version(self, table_name, cik, version):
+        cik = cik or ""
+        versions = self._versions[table_name]
+        versions[cik] = max(versions.get(cik, 0), version)
+
+
+def read_dimension_csv(fileloc):
+    """
+    This function reads a table of the normalized output as text; empty values become None
+
+    fileloc: Path obj, location of .csv file
+    return:  pandas DataFrame
+    """
+
+    df = pd.read_csv(fileloc, dtype=str, keep_default_na=False, na_values=[""])
+
+    return df.astype(object).where(df.notna(), None)
@@ -3,7 +3,7 @@
 
 
 import pandas as pd
-import re
+import io
 import xmltodict
 import flatdict
 from pathlib import Path
@@ -17,6 +17,8 @@ def proc_form4txt(input_path, output_path, filename, output_filename):
     1. Add empty xml elements to xml, so that flatdict can process items consistently
     2. Merge "Holding" to "Transaction", so that no separate form is needed
     3. Edit <footnotes> for flatdict to read properly
+    The processed text is written to a .txt.mod file. Only used for debugging,
+    the default pipeline does the same work in memory with proc_form4text.
     
     input_path:      Path obj, input directory
     output_path:     Path obj, outnput directory
@@ -28,45 +30,84 @@ def proc_form4txt(input_path, output_path, filename, output_filename):
     output_file_loc = output_path / output_filename
 
     with open(input_file_loc, 'r') as lines:
-    
         with open(output_file_loc,'w') as output_file:
-            for line in lines:
-                # add empty xml elements so that flatdic can process all as a list
-                if r'</nonDerivativeTable>' in line and r'<nonDerivativeTable></nonDerivativeTable>' not in line:
-                    output_file.write(r'<nonDerivativeTransaction></nonDerivativeTransaction>' + "\n") 
-                if r'</derivativeTable>' in line and r'<derivativeTable></derivativeTable>' not in line:
-                    output_file.write(r'<derivativeTransaction></derivativeTransaction>' + "\n") 
-                if r'</footnotes>' in line and r'<footnotes></footnotes>' not in line:
-                    output_file.write(line.replace(r'</footnotes>', r'<footnote><footnote_>  </footnote_></footnote></footnotes>'))
-                    continue
-                    
-                # "Holding" and "Transaction" are slight variation of same table
-                if 'nonDerivativeHolding' in line:
-                    output_file.write(line.replace('nonDerivativeHolding', 'nonDerivativeTransaction'))
-                    continue
-                if 'derivativeHolding' in line:
-                    output_file.write(line.replace('derivativeHolding', 'derivativeTransaction'))
-                    continue
-                
-                # add additional nesting in footnote, so that flatdic process and separate the notes
-                if r'<footnote ' in line:
-                    output_file.write(line.replace(' id', '><footnote_>id').replace(r'</footnote>', r'</footnote_></footnote>'))
-                    continue
-                if r'</footnote>' in line:
-                    output_file.write(line.replace(r'</footnote>', r'</footnote_></footnote>'))
-                    continue
-                      
-                output_file.write(line)
+            output_file.writelines(proc_form4lines(lines))
     
     return
 
 
-def form4txt_to_flatdict(filepath, filename):
+def proc_form4text(text):
+    """
+    This function applies the pre-processing of proc_form4txt to a string in memory
+    
+    text:   string, xml text (or full text) of a Form-4.txt file
+    return: string, processed text
+    """
+    
+    return ''.join(proc_form4lines(io.StringIO(text)))
+
+
+def proc_form4lines(lines):
+    """
+    This function processes the lines of a Form-4.txt file, see proc_form4txt
+    
+    lines:  iterable of strings, lines with line endings
+    return: generator of processed lines
+    """
+    
+    for line in lines:
+        # add empty xml elements so that flatdic can process all as a list
+        if r'</nonDerivativeTable>' in line and r'<nonDerivativeTable></nonDerivativeTable>' not in line:
+            yield r'<nonDerivativeTransaction></nonDerivativeTransaction>' + "\n"
+        if r'</derivativeTable>' in line and r'<derivativeTable></derivativeTable>' not in line:
+            yield r'<derivativeTransaction></derivativeTransaction>' + "\n"
+        if r'</footnotes>' in line and r'<footnotes></footnotes>' not in line:
+            yield line.replace(r'</footnotes>', r'<footnote><footnote_>  </footnote_></footnote></footnotes>')
+            continue
+            
+        # "Holding" and "Transaction" are slight variation of same table
+        if 'nonDerivativeHolding' in line:
+            yield line.replace('nonDerivativeHolding', 'nonDerivativeTransaction')
+            continue
+        if 'derivativeHolding' in line:
+            yield line.replace('derivativeHolding', 'derivativeTransaction')
+            continue
+        
+        # add additional nesting in footnote, so that flatdic process and separate the notes
+        if r'<footnote ' in line:
+            yield line.replace(' id', '><footnote_>id').replace(r'</footnote>', r'</footnote_></footnote>')
+            continue
+        if r'</footnote>' in line:
+            yield line.replace(r'</footnote>', r'</footnote_></footnote>')
+            continue
+              
+        yield line
+
+
+def extract_form4xml(data):
+    """
+    This function extracts the text around ownershipDocument, from the first <?xml
+    to the last ownershipDocument> (same span as the regex <\\?xml.*ownershipDocument>)
+    
+    data:   string, full text of a Form-4.txt file
+    return: string, xml text
+    """
+    
+    start = data.find('<?xml')
+    end   = data.rfind('ownershipDocument>')
+    if start < 0 or end < start:
+        raise ValueError("No ownershipDocument found!")
+    
+    return data[start:end + len('ownershipDocument>')]
+
+
+def form4txt_to_flatdict(filepath, filename, keep_mod=False):
     """
     This function reads the processed form4.txt.mod, extract xml information and convert to a flatdict object.
     
     filepath: Path obj, file directory
     filename: string, full filename of file written: Form-4.txt.mod 
+    keep_mod: boolean, keep the temporary .txt.mod file for inspection
     return:   flatdict obj
     """
     
@@ -75,13 +116,20 @@ def form4txt_to_flatdict(filepath, filename):
         data = f.read()
     
     # delete the temporary .txt.mod file
-    input_file_loc.unlink()
+    if not keep_mod:
+        input_file_loc.unlink()
 
-    # extract file around ownershipDocument 
-    matcher = re.compile(r'<\?xml.*ownershipDocument>', flags=re.DOTALL)
-    matches = matcher.search(data)
-    xml     = matches.group(0)
+    return form4xml_to_flatdict(extract_form4xml(data))
 
+
+def form4xml_to_flatdict(xml):
+    """
+    This function converts processed xml text to a flatdict object.
+    
+    xml:    string, pre-processed xml text of ownershipDocument
+    return: flatdict obj
+    """
+    
     # load entire xml to dict object
     xmldict = xmltodict.parse(xml)
 
@@ -109,6 +157,124 @@ def flatdict_to_df(table_d):
     return pd.DataFrame(d_list)
     
 
+def flatdict_to_records(table_d):
+    """
+    This function works like flatdict_to_df, and returns the rows as plain dictionaries instead of a DataFrame
+    
+    table_d: could be list or a dictionary
+    return:  list of dictionaries, flat key -> value
+    """
+
+    if isinstance(table_d, list):
+        return [flatten_dict(i) for i in table_d]
+    
+    return [flatten_dict(table_d)]
+
+
+def flatten_dict(d, prefix='', out=None):
+    """
+    This function flattens nested dictionaries with '.' delimited keys, as flatdict does. Lists are kept as values.
+    
+    d:      dictionary obj, flatdict obj or None
+    prefix: string, key prefix
+    out:    dictionary obj to fill
+    return: dictionary obj
+    """
+    
+    if out is None:
+        out = {}
+    if isinstance(d, flatdict.FlatDict):
+        out.update((prefix + key, value) for key, value in d.items())
+    elif d is not None:
+        for key, value in d.items():
+            if isinstance(value, dict):
+                flatten_dict(value, prefix + key + '.', out)
+            else:
+                out[prefix + key] = value
+    
+    return out
+
+
+def form4dict_to_records(full_dict):
+    """
+    This function takes the flatdict read from xml and builds the rows of the .csv database
+    
+    full_dict: flatdict, contains full flatdic read from xml 
+    return:    list of (name of database, list of rows), in the order they are saved.
+               Rows are tuples in the column order of Form4Data.column_list
+    """
+    
+    return fanout_records(*form4dict_to_parts(full_dict))
+
+
+def form4dict_to_parts(full_dict):
+    """
+    This function takes the flatdict read from xml and splits it into the inputs of fanout_records
+    
+    full_dict: flatdict, contains full flatdic read from xml 
+    return:    (issuer dict, list of owner dicts, name of database -> list of flat table rows, footnotes dict)
+    """
+    
+    keys = set(full_dict.keys())
+    
+    # issuer and reportingOwner first; hopefully these fields are populated
+    issuer = flatten_dict(full_dict["issuer"])
+    owners = full_dict["reportingOwner"]
+    if not isinstance(owners, list):
+        owners = [owners]
+    owners = [flatten_dict(owner) for owner in owners]
+
+    # work on footnotes
+    footnotes_dict = {}
+    if "footnotes.footnote" in keys:
+        footnotes_dict = footnote_list_to_dict(full_dict["footnotes.footnote"])
+
+    tables = {}
+    for table_name, key in (("nonDerivative", "nonDerivativeTable.nonDerivativeTransaction"),
+                            ("derivative", "derivativeTable.derivativeTransaction")):
+        if key in keys:
+            # remove the last row that was added for flatdict reading
+            tables[table_name] = flatdict_to_records(full_dict[key])[:-1]
+
+    return issuer, owners, tables, footnotes_dict
+
+
+def fanout_records(issuer, owners, tables, footnotes_dict):
+    """
+    This function builds the rows of the .csv database of one filing. 
+    Table rows and footnotes are processed once, then repeated for each reporting owner with
+    the issuer and owner information, in the same order as processing owners one by one.
+    
+    issuer:         dictionary obj, flat issuer information
+    owners:         list of dictionaries, flat reporting owner information
+    tables:         dictionary obj, name of database -> list of flat table rows
+    footnotes_dict: dictonary obj, contains id -> string details
+    return:         list of (name of database, list of rows), in the order they are saved.
+                    Rows are tuples in the column order of Form4Data.column_list
+    """
+    
+    # issuer and owner columns come first, footnote is last
+    n_fixed = len(Form4Data.issuer_col_name) + len(Form4Data.reporting_col_name)
+    
+    bodies = {}
+    for table_name, rows in tables.items():
+        column_list = Form4Data.column_list(table_name)
+        Form4Data._check_col_names(column_list, set(issuer).union(*owners, *rows))
+        
+        table_cols    = column_list[n_fixed:-1]
+        footnote_list = get_footnote_list(rows, footnotes_dict)
+        bodies[table_name] = [tuple([row.get(c) for c in table_cols]) + (note,) for row, note in zip(rows, footnote_list)]
+
+    issuer_part = tuple([issuer.get(c) for c in Form4Data.issuer_col_name])
+    records = []
+    for owner in owners:
+        fixed = issuer_part + tuple([owner.get(c) for c in Form4Data.reporting_col_name])
+        for table_name, body in bodies.items():
+            records.append((table_name, [fixed + row for row in body]))
+
+    return records
+
+
 def form4df_to_csv(filepath, full_dict, issuer_df, reportingOwner_df):
     """
     This function takes read-in information and save it to .csv database
@@ -205,12 +371,41 @@ def footnotes_to_dict(footnotes_df):
     footnote_dict = {}
     
     for i, value in footnotes_df.iloc[:-1].items():
-        s_tmp, s_text = value.split(r'>')
-        s_id = s_tmp.split(r'"')[1]
-           
-        footnote_dict[s_id] = s_id + r': ' + s_text
+        s_id, s_text = _split_footnote(value)
+        footnote_dict[s_id] = s_text
 
     return footnote_dict
+
+
+def footnote_list_to_dict(footnotes_d):
+    """
+    This function works like footnotes_to_dict, on the "footnotes.footnote" value of the flatdict
+    footnotes_d: list of dictionaries or a dictionary
+    return:      dict obj
+    """
+    
+    if not isinstance(footnotes_d, list):
+        footnotes_d = [footnotes_d]
+    
+    footnote_dict = {}
+    
+    # the last item was added for flatdict reading
+    for item in footnotes_d[:-1]:
+        s_id, s_text = _split_footnote(item["footnote_"])
+        footnote_dict[s_id] = s_text
+
+    return footnote_dict
+
+
+def _split_footnote(value):
+    """
+    This function splits a pre-processed footnote 'id="F1">text' into its id and 'F1: text'
+    """
+    
+    s_tmp, s_text = value.split(r'>')
+    s_id = s_tmp.split(r'"')[1]
+    
+    return s_id, s_id + r': ' + s_text
     
     
 def get_footnote_info(df, footnotes_dict, col_has_footnote):
@@ -248,3 +443,38 @@ def get_footnote_info(df, footnotes_dict, col_has_footnote):
     return pd.concat([df,footnote_col], axis=1)
 
 
+def get_footnote_list(rows, footnotes_dict):
+    """
+    This function works like get_footnote_info, on a list of flat dictionaries instead of a DataFrame.
+    The footnote text of a row joins its footnotes in sorted column name order, the column order of a
+    DataFrame built from flatdict objects. As in get_footnote_info, a text already given to an earlier
+    row (in column, then row order) is not repeated.
+
+    rows:           list of dictionaries, one per table row, keys are flatdict column names
+    footnotes_dict: dictonary obj, contains id -> string details
+    return:         list of string or None, footnote text of each row
+    """
+
+    col_has_footnote = sorted({col for row in rows for col in row if 'footnote' in col})
+
+    # row index -> footnote texts, and the order in which rows are first seen
+    f_text  = {}
+    for i in col_has_footnote:
+        for idx, row in enumerate(rows):
+            value = row.get(i)
+            # more than one footnotes in this tag
+            if isinstance(value, list):
+                for j in value:
+                    f_text.setdefault(idx, []).append(footnotes_dict[j["@id"]])
+            elif value is not None and "F" in value:
+                f_text.setdefault(idx, []).append(footnotes_dict[value])
+
+    footnote_list = [None] * len(rows)
+    used = set()
+    for idx, texts in f_text.items():
+        text = ' '.join(texts)
+        if text not in used:
+            used.add(text)
+            footnote_list[idx] = text
+
+    return footnote_list
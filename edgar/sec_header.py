@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+
+import re
+
+
+# <SEC-HEADER> field -> name used in the output
+HEADER_FIELDS = {
+    "ACCESSION NUMBER": "accessionNumber",
+    "CONFORMED SUBMISSION TYPE": "submissionType",
+    "CONFORMED PERIOD OF REPORT": "periodOfReport",
+    "FILED AS OF DATE": "filingDate",
+    }
+
+# fields of the ISSUER: section of the header
+ISSUER_FIELDS = {
+    "CENTRAL INDEX KEY": "issuerCik",
+    "STANDARD INDUSTRIAL CLASSIFICATION": "issuerSic",
+    }
+
+DATE_FIELDS = ["periodOfReport", "filingDate"]
+
+
+def read_sec_header(fileloc, max_bytes=65536):
+    """
+    This function reads only the <SEC-HEADER> block at the start of a Form-4.txt file, not the xml body
+
+    fileloc:   Path obj, location of Form-4.txt file
+    max_bytes: int, stop reading after this many bytes if </SEC-HEADER> is not found
+    return:    dict, see parse_sec_header
+    """
+
+    data = b''
+    with open(fileloc, 'rb') as f:
+        while b'</SEC-HEADER>' not in data and len(data) < max_bytes:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            data += chunk
+
+    return parse_sec_header(data.decode('utf-8', errors='replace'))
+
+
+def parse_sec_header(text):
+    """
+    This function reads the fields of the <SEC-HEADER> block of a filing.
+    Dates are formatted as YYYY-MM-DD, the SIC code is the number in brackets. Missing fields are None.
+
+    text:   string, start of the Form-4.txt file (anything after </SEC-HEADER> is ignored)
+    return: dict, with keys accessionNumber, submissionType, periodOfReport, filingDate, issuerCik and issuerSic
+    """
+
+    header = dict.fromkeys(list(HEADER_FIELDS.values()) + list(ISSUER_FIELDS.values()))
+
+    end = text.find('</SEC-HEADER>')
+    if end >= 0:
+        text = text[:end]
+
+    # top level "KEY: value" lines start a new section, indented lines belong to the last section
+    section = None
+    for match in re.finditer(r'^([ \t]*)([A-Z][A-Z \-]*):[ \t]*(.*?)[ \t]*$', text, flags=re.MULTILINE):
+        indent, key, value = match.groups()
+        if not indent:
+            section = key
+            name    = HEADER_FIELDS.get(key)
+        elif section == "ISSUER":
+            name    = ISSUER_FIELDS.get(key)
+        else:
+            continue
+        if name is not None and header[name] is None:
+            header[name] = value or None
+
+    for name in DATE_FIELDS:
+        value = header[name]
+        if value is not None and len(value) == 8 and value.isdigit():
+            header[name] = value[:4] + "-" + value[4:6] + "-" + value[6:]
+
+    sic = header["issuerSic"]
+    if sic is not None:
+        match = re.search(r'\[(\d+)\]\s*$', sic)
+        header["issuerSic"] = match.group(1) if match else None
+
+    return header
+
+
+class HeaderFilter:
+    """
+    Create a class for selecting filings from their <SEC-HEADER> block, before the xml is parsed
+
+    All the given conditions must match. A condition left as None matches every filing.
+
+    self.ciks:       set of int, issuer CIKs to keep
+    self.sics:       list of (int, int), ranges of issuer SIC codes to keep, ends included
+    self.date_from:  string, YYYY-MM-DD, first filing date to keep
+    self.date_to:    string, YYYY-MM-DD, last filing date to keep
+    self.form_types: set of strings, submission types to keep, e.g. {"4"} drops the 4/A amendments
+
+    """
+
+    def __init__(self, ciks=None, sics=None, date_from=None, date_to=None, form_types=None):
+        self.ciks       = None if ciks is None else {int(c) for c in ciks}
+        self.sics       = None if sics is None else [_sic_range(s) for s in sics]
+        self.date_from  = date_from
+        self.date_to    = date_to
+        self.form_types = None if form_types is None else {str(t).upper() for t in form_types}
+
+
+    @classmethod
+    def from_args(cls, cik=None, sic=None, date_from=None, date_to=None, form_type=None):
+        """
+        This function creates a filter from comma separated strings, as given on the command line
+
+        cik:       string, e.g. "320193,789019"
+        sic:       string, codes or ranges, e.g. "6000-6799,7372"
+        date_from: string, YYYY-MM-DD
+        date_to:   string, YYYY-MM-DD
+        form_type: string, e.g. "4" or "4,4/A"
+        return:    HeaderFilter obj, or None when no condition is given
+        """
+
+        if cik is None and sic is None and date_from is None and date_to is None and form_type is None:
+            return None
+
+        return cls(_split(cik), _split(sic), date_from, date_to, _split(form_type))
+
+
+    def match(self, header):
+        """
+        This function checks if a filing is selected
+
+        header: dict, see parse_sec_header
+        return: boolean
+        """
+
+        if self.ciks is not None:
+            cik = header["issuerCik"]
+            if cik is None or not cik.isdigit() or int(cik) not in self.ciks:
+                return False
+
+        if self.sics is not None:
+            sic = header["issuerSic"]
+            if sic is None or not any(low <= int(sic) <= high for low, high in self.sics):
+                return False
+
+        date = header["filingDate"]
+        if self.date_from is not None and (date is None or date < self.date_from):
+            return False
+        if self.date_to is not None and (date is None or date > self.date_to):
+            return False
+
+        if self.form_types is not None:
+            if (header["submissionType"] or "").upper() not in self.form_types:
+                return False
+
+        return True
+
+
+def _split(value):
+    if value is None:
+        return None
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def _sic_range(value):
+    low, _, high = str(value).partition("-")
+    return int(low), int(high or low)
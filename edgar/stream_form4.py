@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+import xml.etree.ElementTree as ET
+
+
+# xml table -> (name of database, element names of the rows)
+TABLE_TAGS = {
+    "nonDerivativeTable": ("nonDerivative", ("nonDerivativeTransaction", "nonDerivativeHolding")),
+    "derivativeTable":    ("derivative",    ("derivativeTransaction", "derivativeHolding")),
+    }
+
+
+def parse_form4xml(xml, chunk_size=65536):
+    """
+    This function walks ownershipDocument once with an incremental parser.
+    Each issuer, reporting owner, table row and footnote is flattened when its end tag is read,
+    then cleared, so the tree is never held in memory.
+    Keys follow the flatdict column names of the xmltodict engine, e.g. "transactionAmounts.transactionShares.value".
+    Holding rows are merged into the Transaction rows of the same table.
+
+    xml:        string, xml text of ownershipDocument
+    chunk_size: int, number of characters fed to the parser at a time
+    return:     dict with "issuer" (dict), "owners" (list of dict), "tables" (name of database -> list of dict)
+                and "footnotes" (id -> string details)
+    """
+
+    doc = {"issuer": {}, "owners": [], "tables": {}, "footnotes": {}}
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack  = []
+
+    for i in range(0, len(xml), chunk_size):
+        parser.feed(xml[i:i + chunk_size])
+        _read_events(parser, stack, doc)
+    parser.close()
+    _read_events(parser, stack, doc)
+
+    # nonDerivative first, whatever the order in the document
+    doc["tables"] = {name: doc["tables"][name] for name, _ in TABLE_TAGS.values() if name in doc["tables"]}
+
+    return doc
+
+
+def _read_events(parser, stack, doc):
+    for event, elem in parser.read_events():
+        tag = _local_name(elem.tag)
+        if event == "start":
+            stack.append(tag)
+            continue
+
+        stack.pop()
+        depth = len(stack)
+        if depth == 1:
+            if tag == "issuer":
+                doc["issuer"] = _flatten(elem)
+            elif tag == "reportingOwner":
+                doc["owners"].append(_flatten(elem))
+            elem.clear()
+        elif depth == 2:
+            parent = stack[-1]
+            if parent in TABLE_TAGS:
+                table_name, row_tags = TABLE_TAGS[parent]
+                if tag in row_tags:
+                    doc["tables"].setdefault(table_name, []).append(_flatten(elem))
+                elem.clear()
+            elif parent == "footnotes" and tag == "footnote":
+                s_id = elem.get("id")
+                doc["footnotes"][s_id] = s_id + r': ' + "".join(elem.itertext()).rstrip()
+                elem.clear()
+
+
+def _flatten(elem, prefix="", out=None):
+    """
+    This function flattens the children of an element the way xmltodict + flatdict do:
+    attributes are "@name" keys, empty elements are None, repeated elements are kept as a list.
+
+    elem:   Element obj
+    prefix: string, key prefix of the children
+    out:    dictionary obj to fill
+    return: dictionary obj, flat key -> string, None or list
+    """
+
+    if out is None:
+        out = {}
+    for name, value in elem.attrib.items():
+        out[prefix + "@" + name] = value
+
+    for tag, children in _group_children(elem).items():
+        key = prefix + tag
+        if len(children) > 1:
+            out[key] = [_to_xmltodict(child) for child in children]
+        elif len(children[0]) or children[0].attrib:
+            _flatten(children[0], key + ".", out)
+        else:
+            out[key] = _text(children[0])
+
+    text = _mixed_text(elem)
+    if text:
+        out[prefix + "#text"] = text
+
+    return out
+
+
+def _to_xmltodict(elem):
+    """
+    This function returns the xmltodict value of an element, used for repeated elements
+    """
+
+    if not len(elem) and not elem.attrib:
+        return _text(elem)
+
+    value = {"@" + name: v for name, v in elem.attrib.items()}
+    for tag, children in _group_children(elem).items():
+        items = [_to_xmltodict(child) for child in children]
+        value[tag] = items if len(items) > 1 else items[0]
+    text = _mixed_text(elem)
+    if text:
+        value["#text"] = text
+
+    return value
+
+
+def _group_children(elem):
+    groups = {}
+    for child in elem:
+        groups.setdefault(_local_name(child.tag), []).append(child)
+    return groups
+
+
+def _text(elem):
+    return (elem.text.strip() or None) if elem.text else None
+
+
+def _mixed_text(elem):
+    if len(elem):
+        return "".join([elem.text or ""] + [child.tail or "" for child in elem]).strip()
+    return (elem.text or "").strip()
+
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
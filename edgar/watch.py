@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+
+import os
+import time
+import cProfile
+from pathlib import Path
+from .archive import read_gzip
+from .edgar_form4 import form4_to_records, filter_form4inputs, open_form4output, add_form4output, commit_form4output, \
+                         _print_processing, _print_stale
+from .aggregate import Form4Aggregates
+from .cache import Form4Cache
+from .manifest import Form4Manifest
+from .metrics import Form4Metrics
+
+
+class Form4Watcher:
+    """
+    Create a class for finding the Form-4.txt files newly completed in a spool directory
+
+    A file is complete when its size and mtime are the same in two consecutive polls, and it was last
+    modified at least settle seconds ago, so files still being written are not read. Only names ending
+    with .txt or .txt.gz are listed: a file written under a temporary name is picked up once renamed.
+    Each file is returned once; a file written again under the same name is not returned again.
+
+    self.input_path: Path obj, spool directory
+    self.settle:     float, seconds since the last modification before a file is complete
+    self.seen:       set of filenames already returned
+
+    """
+
+    def __init__(self, input_path, settle=1.0):
+        self.input_path = Path(input_path)
+        self.settle     = settle
+        self.seen       = set()
+        self._pending   = {}
+
+
+    def poll(self):
+        """
+        This function lists the directory once and returns the files completed since the last poll
+
+        return: list of (filename, float mtime), oldest first
+        """
+
+        now     = time.time()
+        ready   = []
+        pending = {}
+        with os.scandir(self.input_path) as entries:
+            for entry in entries:
+                name = entry.name
+                if name in self.seen or not (name.endswith(".txt") or name.endswith(".txt.gz")):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # removed or renamed since the listing
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if self._pending.get(name) == signature and now - stat.st_mtime >= self.settle:
+                    ready.append((stat.st_mtime_ns, name))
+                else:
+                    pending[name] = signature
+        self._pending = pending
+
+        ready.sort()
+        self.seen.update(name for mtime_ns, name in ready)
+
+        return [(name, mtime_ns / 1e9) for mtime_ns, name in ready]
+
+
+def watch_form4(input_path, output_path, interval=1.0, settle=1.0, batch_size=100, buffer_rows=10000,
+                buffer_bytes=16 * 2**20, engine="xmltodict", output_format="csv", header_filter=None,
+                header_cols=False, normalized=False, verbose=True, top_n=10, stop=None, idle_timeout=None,
+                aggregates=False, profile=None, cache_path=None, cache_bytes=2**30):
+    """
+    This function watches a spool directory and processes the Form-4.txt files as they are completed,
+    in batches, with the output files kept open. The rows of each batch are written before the next poll.
+    Filings are recorded in output_path/manifest.jsonl, so a restart skips the files already processed.
+
+    input_path:   string, spool directory of .txt and .txt.gz files
+    output_path:  string, directory for output files
+    interval:     float, seconds between two polls of the directory when no file is ready
+    settle:       float, seconds since the last modification before a file is read, see Form4Watcher
+    batch_size:   int, maximum number of files processed before the rows are written
+    buffer_rows, buffer_bytes, engine, output_format, header_filter, header_cols, normalized, verbose, top_n,
+    aggregates, profile, cache_path, cache_bytes:
+                  see run_form4
+    stop:         threading.Event obj, or any obj with is_set(); the current batch is written and the
+                  function returns once it is set, e.g. by a signal handler
+    idle_timeout: float, return when no file was ready for this many seconds. Default is to run until stop
+    return:       dict, see run_form4, with a "failed" list of files that could not be parsed.
+                  The "latency" of the metrics is the time from the last modification of a file to its rows written
+    """
+
+    start       = time.perf_counter()
+    input_path  = Path(input_path)
+    output_path = Path(output_path)
+    report      = {"processed": [], "changed": [], "stale": [], "skipped": [], "duplicate": [], "filtered": [],
+                   "failed": []}
+    metrics     = Form4Metrics(top_n)
+    watcher     = Form4Watcher(input_path, settle)
+    manifest    = Form4Manifest(output_path, output_format, header_cols, normalized)
+
+    profiler = None
+    if profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    writer, normalizer, header_cols = open_form4output(output_path, output_format, buffer_rows, buffer_bytes,
+                                                       header_cols, normalized)
+    cache      = Form4Cache(cache_path, cache_bytes) if cache_path is not None else None
+    aggregator = Form4Aggregates(output_path) if aggregates else None
+    last_ready = time.monotonic()
+    try:
+        with writer:
+            writer.on_flush = commit_form4output(manifest, aggregator)
+            while stop is None or not stop.is_set():
+                ready = watcher.poll()
+                if not ready:
+                    if idle_timeout is not None and time.monotonic() - last_ready >= idle_timeout:
+                        break
+                    _sleep(stop, interval)
+                    continue
+
+                last_ready = time.monotonic()
+                for i in range(0, len(ready), batch_size):
+                    _watch_batch(ready[i:i + batch_size], input_path, output_path, engine, header_filter, header_cols,
+                                 writer, normalizer, manifest, aggregator, cache, report, metrics, verbose)
+                    if stop is not None and stop.is_set():
+                        break
+            # rows left in the buffer are written when the writer is closed
+    finally:
+        if aggregator is not None:
+            aggregator.close()
+        if cache is not None:
+            cache.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+
+    report["metrics"] = metrics.to_dict(time.perf_counter() - start)
+    _print_stale(report)
+
+    return report
+
+
+def _watch_batch(batch, input_path, output_path, engine, header_filter, header_cols,
+                 writer, normalizer, manifest, aggregates, cache, report, metrics, verbose):
+    """
+    This function processes a batch of completed files and writes their rows
+    """
+
+    arrival = {}
+    items   = []
+    for name, mtime in batch:
+        try:
+            item = (name[:-3], read_gzip(input_path / name)) if name.endswith(".gz") else (name, None)
+        except OSError as e:
+            print("Error reading " + name + ": " + str(e))
+            report["failed"].append(name)
+            continue
+        arrival[item[0]] = mtime
+        items.append(item)
+
+    if header_filter is not None:
+        items = filter_form4inputs(input_path, items, header_filter, report, metrics)
+    items = manifest.filter(input_path, items, report)
+
+    written = []
+    for filename, data in _print_processing(items, verbose):
+        try:
+            tables = form4_to_records(input_path, output_path, filename, False, engine, header_cols, data, metrics,
+                                      cache)
+        except Exception as e:
+            # one bad filing does not stop the watch
+            print("Error processing " + filename + ": " + repr(e))
+            report["failed"].append(filename)
+            continue
+        add_form4output(writer, normalizer, manifest, filename, tables, report, metrics, aggregates)
+        written.append(filename)
+
+    write_start = time.perf_counter()
+    writer.flush()
+    metrics.add_time("write", time.perf_counter() - write_start)
+
+    now = time.time()
+    for filename in written:
+        metrics.add_latency(now - arrival[filename])
+    if verbose and written:
+        print("Wrote %d files, latency max %.3f s" % (len(written), now - min(arrival[f] for f in written)))
+
+    return
+
+
+def _sleep(stop, seconds):
+    if hasattr(stop, "wait"):
+        stop.wait(seconds)
+    else:
+        time.sleep(seconds)
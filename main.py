@@ -5,21 +5,86 @@
 # Example: (create the ./scratch directory or replace with your output directory)
 #
 # python main.py  -i ./tests/test_1 -o ./scratch
+#
+# Watch a spool directory until Ctrl-C:
+# python main.py  -i ./spool -o ./scratch --watch
 #  
 
 
 import argparse
-from edgar import run_form4
+import os
+import json
+import pstats
+import signal
+import threading
+from edgar import run_form4, watch_form4, HeaderFilter
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='SEC Edgar Form 4 reader')
-    parser.add_argument('-i','--input_path', type=str, help='Enter directory of input files', required=True)
+    parser.add_argument('-i','--input_path', type=str, help='Enter directory of input files, archive file (.tar.gz, .tgz, .tar, .zip, .gz), or feed file of many <SEC-DOCUMENT> blocks', required=True)
     parser.add_argument('-o','--output_path', type=str, help='Enter output directory ', required=True)
     parser.add_argument('-l','--list_order', type=bool, default=False, help='Read the .txt files in the order specified by a file list_txt. For testing purpose. Default is False', required=False)
+    parser.add_argument('-d','--debug', action='store_true', help='Write the pre-processed .txt.mod files to the output directory and keep them. Default is False', required=False)
+    parser.add_argument('-w','--workers', type=int, default=1, help='Number of processes used to parse the .txt files. Output order is the same as with 1 process. Default is 1', required=False)
+    parser.add_argument('-b','--buffer_rows', type=int, default=10000, help='Number of rows kept in memory before writing to the .csv files. Default is 10000', required=False)
+    parser.add_argument('-e','--engine', type=str, default='xmltodict', choices=['xmltodict', 'stream'], help='Parser engine. "stream" is faster and gives the same output. Default is xmltodict', required=False)
+    parser.add_argument('--incremental', action='store_true', help='Skip the files already processed into the output directory (recorded in manifest.jsonl), unless they changed. Default is False', required=False)
+    parser.add_argument('-f','--format', type=str, default='csv', choices=['csv', 'parquet', 'sqlite'], help='Output format. "parquet" writes typed columns partitioned by filing year and quarter, and needs pyarrow. "sqlite" writes typed, indexed tables to form4.db, a filing processed again replaces its rows. Default is csv', required=False)
+    parser.add_argument('--cik', type=str, default=None, help='Only process the filings of these issuer CIKs, comma separated', required=False)
+    parser.add_argument('--sic', type=str, default=None, help='Only process the filings of issuers with these SIC codes, comma separated codes or ranges, e.g. 6000-6799,7372', required=False)
+    parser.add_argument('--date_from', type=str, default=None, help='Only process the filings filed on or after this date, YYYY-MM-DD', required=False)
+    parser.add_argument('--date_to', type=str, default=None, help='Only process the filings filed on or before this date, YYYY-MM-DD', required=False)
+    parser.add_argument('--form_type', type=str, default=None, help='Only process these submission types, comma separated, e.g. 4 to skip the 4/A amendments', required=False)
+    parser.add_argument('--header_cols', action='store_true', help='Add the accessionNumber and filingDate columns to the .csv files. Default is False', required=False)
+    parser.add_argument('--normalized', action='store_true', help='Write issuers.csv and reportingOwners.csv once per distinct issuer and owner, and fact tables that refer to them by key. Default is False', required=False)
+    parser.add_argument('-q','--quiet', action='store_true', help='Do not print the name of each file processed, the counts of filtered and skipped files, nor the run summary. Default is False', required=False)
+    parser.add_argument('--metrics_json', type=str, default=None, help='Save the timers and counters of the run to this .json file', required=False)
+    parser.add_argument('--profile', type=str, default=None, help='Save cProfile statistics of the main process to this file and print the top functions', required=False)
+    parser.add_argument('--cache_path', type=str, default=None, help='Directory of a cache of parsed filings; filings already in the cache are not parsed again', required=False)
+    parser.add_argument('--cache_mb', type=int, default=1024, help='Maximum size of the cache in MB, the least recently used filings are removed. Default is 1024', required=False)
+    parser.add_argument('--aggregates', action='store_true', help='Update the insider-activity sums (shares and value acquired and disposed per issuer, owner, day and transaction code) of aggregates.db in the output directory. Default is False', required=False)
+    parser.add_argument('--watch', action='store_true', help='Keep running, and process the new files of the input directory as they are completed. Stop with Ctrl-C or SIGTERM, pending rows are written. Always records manifest.jsonl, uses 1 process; not allowed with -l, -d, -w and --incremental. Default is False', required=False)
+    parser.add_argument('--interval', type=float, default=1.0, help='With --watch, seconds between two polls of the input directory. Default is 1.0', required=False)
+    parser.add_argument('--settle', type=float, default=1.0, help='With --watch, seconds since the last modification before a file is read. Default is 1.0', required=False)
+    parser.add_argument('--batch_size', type=int, default=100, help='With --watch, maximum number of files processed before the rows are written. Default is 100', required=False)
+    parser.add_argument('--idle_timeout', type=float, default=None, help='With --watch, stop when no new file was ready for this many seconds', required=False)
     args = parser.parse_args()
     
+    header_filter = HeaderFilter.from_args(args.cik, args.sic, args.date_from, args.date_to, args.form_type)
+    
+    if args.watch:
+        # options of a single run over the input directory
+        for option, used in (("-l/--list_order", args.list_order), ("-d/--debug", args.debug),
+                             ("-w/--workers", args.workers != 1), ("--incremental", args.incremental)):
+            if used:
+                parser.error("argument %s: not allowed with --watch" % option)
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        report = watch_form4(args.input_path, args.output_path, args.interval, args.settle, args.batch_size,
+                             buffer_rows=args.buffer_rows, engine=args.engine, output_format=args.format,
+                             header_filter=header_filter, header_cols=args.header_cols, normalized=args.normalized,
+                             verbose=not args.quiet, stop=stop, idle_timeout=args.idle_timeout, aggregates=args.aggregates,
+                             profile=args.profile, cache_path=args.cache_path, cache_bytes=args.cache_mb * 2**20)
+    else:
+        report = run_form4(args.input_path, args.output_path, args.list_order, args.debug, args.workers,
+                           buffer_rows=args.buffer_rows, engine=args.engine, incremental=args.incremental,
+                           output_format=args.format, header_filter=header_filter, header_cols=args.header_cols,
+                           verbose=not args.quiet, profile=args.profile, normalized=args.normalized,
+                           cache_path=args.cache_path, cache_bytes=args.cache_mb * 2**20, aggregates=args.aggregates)
+    
+    metrics = report["metrics"]
+    if not args.quiet:
+        print("Processed %d files in %.2f s, %.1f files/s" % (metrics["counters"]["files"], metrics["seconds"], metrics["files_per_s"]))
+    if not args.quiet and "latency" in metrics:
+        print("Latency from file arrival to rows written: mean %(mean).3f s, p95 %(p95).3f s, max %(max).3f s" % metrics["latency"])
+    
+    if args.metrics_json is not None:
+        with open(args.metrics_json, 'w') as f:
+            json.dump(metrics, f, indent=2)
     
-    run_form4(args.input_path, args.output_path, args.list_order)
+    if args.profile is not None and os.path.exists(args.profile):
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(20)
     
     
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, Form4Aggregates, Form4Data
+
+
+def test_100_aggregates(tmp_path):
+    input_path = Path("./tests/test_100")
+    run_form4(input_path, tmp_path, True, verbose=False, aggregates=True, buffer_rows=50)
+    # a filing processed again replaces its contribution
+    run_form4(input_path, tmp_path, True, verbose=False, aggregates=True)
+
+    # rows with the accession number, to find the joint filings
+    (tmp_path / "csv").mkdir()
+    run_form4(input_path, tmp_path / "csv", True, verbose=False, header_cols=True)
+    df = pd.read_csv(tmp_path / "csv" / "nonDerivative.csv", dtype=str)
+    # holdings are not transactions
+    holding = df["transactionDate.value"].isna() | df["transactionCoding.transactionCode"].isna()
+    assert holding.any()
+    df = df[~holding]
+
+    aggregates = Form4Aggregates(tmp_path)
+    assert aggregates.query(group_by=["ownerCik"])["n_transactions"].sum() == len(df)
+
+    # issuer totals count the transactions of a joint filing once: the rows of its first reporting owner
+    owner = df["reportingOwnerId.rptOwnerCik"]
+    first = owner.groupby(df["accessionNumber"]).transform("first")
+    assert (owner != first).any()
+    df = df[owner == first]
+
+    shares = pd.to_numeric(df["transactionAmounts.transactionShares.value"], errors="coerce").fillna(0)
+    price  = pd.to_numeric(df["transactionAmounts.transactionPricePerShare.value"], errors="coerce").fillna(0)
+    code   = df["transactionAmounts.transactionAcquiredDisposedCode.value"]
+    sign   = np.where(code == "A", 1, np.where(code == "D", -1, 0))
+    df = df.assign(net_shares=shares * sign, net_value=shares * price * sign)
+    expected = df.groupby(df["issuerCik"].str.lstrip("0"))[["net_shares", "net_value"]].sum()
+
+    result = aggregates.query(group_by=["issuerCik"]).set_index("issuerCik").loc[expected.index]
+    assert result["n_transactions"].sum() == len(df)
+    assert np.allclose(result["net_shares"], expected["net_shares"])
+    assert np.allclose(result["net_value"], expected["net_value"])
+    aggregates.close()
+
+
+def _rows(owner_cik, date, shares, code, price="10"):
+    row = dict.fromkeys(Form4Data.column_list("nonDerivative"))
+    row.update({"issuerCik": "0000000001", "reportingOwnerId.rptOwnerCik": owner_cik,
+                "transactionDate.value": date, "transactionCoding.transactionCode": "P",
+                "transactionAmounts.transactionShares.value": shares,
+                "transactionAmounts.transactionAcquiredDisposedCode.value": code,
+                "transactionAmounts.transactionPricePerShare.value": price})
+    return [("nonDerivative", [tuple(row.values())])]
+
+
+def test_aggregates_window(tmp_path):
+    aggregates = Form4Aggregates(tmp_path)
+    aggregates.add("0000000001-20-000001.txt", _rows("0000000002", "2020-01-01", "100", "A"))
+    aggregates.add("0000000001-20-000002.txt", _rows("0000000003", "2020-01-10", "40", "D"))
+    aggregates.add("0000000001-20-000003.txt", _rows("0000000002", "2020-02-15", "5", "A"))
+    # a holding, without transaction date: not counted
+    aggregates.add("0000000001-20-000004.txt", _rows("0000000002", None, "500", None))
+    aggregates.commit()
+
+    total = aggregates.query(issuer_cik="1", group_by=[])
+    assert total["net_shares"][0] == 65
+    assert total["net_value"][0] == 650
+    by_owner = aggregates.query(owner_cik="0000000002", date_to="2020-01-31", group_by=["ownerCik"])
+    assert list(by_owner["net_shares"]) == [100]
+    assert aggregates.query(group_by=["date"])["date"].ne("").all()
+
+    window = aggregates.rolling(30, issuer_cik="1", date_from="2020-01-05", date_to="2020-02-15")
+    assert window.loc["2020-01-05", "net_shares"] == 100
+    assert window.loc["2020-01-30", "net_shares"] == 60
+    assert window.loc["2020-01-31", "net_shares"] == -40
+    assert window.loc["2020-02-15", "net_shares"] == 5
+
+    # the second filing is amended: its old rows are replaced
+    aggregates.add("0000000001-20-000002.txt", _rows("0000000003", "2020-01-10", "10", "D"))
+    aggregates.commit()
+    assert aggregates.query(issuer_cik="1", group_by=[])["net_shares"][0] == 95
+    aggregates.close()
+
+
+def test_aggregates_joint_filing(tmp_path):
+    # the transaction of a joint filing is repeated for each reporting owner, issuer totals count it once
+    aggregates = Form4Aggregates(tmp_path)
+    first  = _rows("0000000002", "2020-01-01", "100", "A")
+    second = _rows("0000000003", "2020-01-01", "100", "A")
+    # one entry per reporting owner, as form4_to_records gives them
+    aggregates.add("0000000001-20-000001.txt", first + second)
+    aggregates.commit()
+
+    assert aggregates.query(issuer_cik="1", group_by=[])["net_shares"][0] == 100
+    assert aggregates.query(issuer_cik="1", group_by=["date"])["n_transactions"].tolist() == [1]
+    by_owner = aggregates.query(issuer_cik="1", group_by=["ownerCik"])
+    assert by_owner["net_shares"].tolist() == [100, 100]
+    assert aggregates.rolling(30, issuer_cik="1", date_from="2020-01-01", date_to="2020-01-01")["net_shares"].tolist() == [100]
+
+    # processed again: both levels are replaced
+    aggregates.add("0000000001-20-000001.txt", first)
+    aggregates.commit()
+    assert aggregates.query(issuer_cik="1", group_by=[])["net_shares"][0] == 100
+    assert aggregates.query(group_by=["ownerCik"])["ownerCik"].tolist() == ["2"]
+    aggregates.close()
@@ -0,0 +1,88 @@
+import pytest
+import gzip
+import tarfile
+import zipfile
+import filecmp
+from pathlib import Path
+from edgar import run_form4
+
+
+def _list_txt(input_path):
+    return [line.strip() for line in open(input_path / "list_txt")]
+
+
+def _assert_same_csv(output_path, input_path):
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+
+
+# python main.py  -i ./scratch/test_100.tar.gz -o ./scratch
+@pytest.mark.parametrize("suffix", [".tar.gz", ".zip"])
+def test_100_archive(tmp_path, suffix):
+    input_path  = Path("./tests/test_100")
+    archive     = tmp_path / ("test_100" + suffix)
+    output_path = tmp_path / "test_100_archive"
+    output_path.mkdir()
+
+    # members stored in the order of list_txt, under a sub-directory
+    if suffix == ".zip":
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(input_path / "list_txt", "QTR1/list_txt")
+            for filename in _list_txt(input_path):
+                zf.write(input_path / filename, "QTR1/" + filename)
+    else:
+        with tarfile.open(archive, "w:gz") as tf:
+            for filename in _list_txt(input_path):
+                tf.add(input_path / filename, "QTR1/" + filename)
+
+    report = run_form4(archive, output_path, False, engine="stream", workers=2, chunksize=7)
+    assert len(report["processed"]) == 100
+    _assert_same_csv(output_path, input_path)
+
+
+# python main.py  -i ./scratch/test_100_gz -o ./scratch -l True
+def test_100_gz_files(tmp_path):
+    input_path  = Path("./tests/test_100")
+    gz_path     = tmp_path / "test_100_gz"
+    output_path = tmp_path / "test_100_gz_out"
+    gz_path.mkdir()
+    output_path.mkdir()
+
+    (gz_path / "list_txt").write_bytes((input_path / "list_txt").read_bytes())
+    for filename in _list_txt(input_path):
+        with gzip.open(gz_path / (filename + ".gz"), "wb") as f:
+            f.write((input_path / filename).read_bytes())
+
+    report = run_form4(gz_path, output_path, True, incremental=True)
+    assert len(report["processed"]) == 100
+    _assert_same_csv(output_path, input_path)
+
+    report = run_form4(gz_path, output_path, True, incremental=True)
+    assert len(report["skipped"]) == 100 and not report["processed"]
+
+
+# python main.py  -i ./scratch/feed.txt -o ./scratch
+def test_100_feed(tmp_path):
+    input_path  = Path("./tests/test_100")
+    feed        = tmp_path / "feed.txt"
+    output_path = tmp_path / "test_100_feed"
+    output_path.mkdir()
+
+    # Form 4 documents back to back, with other documents in between
+    other = (b"<SEC-DOCUMENT>0000000000-20-000001.txt : 20200103\n<SEC-HEADER>\n"
+             b"ACCESSION NUMBER:\t\t0000000000-20-000001\nCONFORMED SUBMISSION TYPE:\t8-K\n</SEC-HEADER>\n"
+             b"<DOCUMENT>\n<TEXT>\n<?xml version=\"1.0\"?><ownershipDocument></ownershipDocument>\n"
+             b"</TEXT>\n</DOCUMENT>\n</SEC-DOCUMENT>\n")
+    with open(feed, "wb") as f:
+        f.write(other)
+        for i, filename in enumerate(_list_txt(input_path)):
+            f.write((input_path / filename).read_bytes())
+            if i % 10 == 0:
+                f.write(other)
+
+    report = run_form4(feed, output_path, False)
+    assert len(report["processed"]) == 100
+    assert report["processed"][0] == _list_txt(input_path)[0].split("_")[-1]
+    _assert_same_csv(output_path, input_path)
@@ -0,0 +1,74 @@
+import filecmp
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, Form4Data, Form4Cache
+
+
+def test_100_cache(tmp_path):
+    input_path = Path("./tests/test_100")
+    cache_path = tmp_path / "cache"
+    for name in ("cold", "cached"):
+        output_path = tmp_path / name
+        output_path.mkdir()
+        report = run_form4(input_path, output_path, True, engine="stream", verbose=False, cache_path=cache_path)
+        for table_name in ("nonDerivative", "derivative"):
+            assert filecmp.cmp(output_path / (table_name + ".csv"), input_path / (table_name + ".csv"), shallow=False)
+    assert report["metrics"]["counters"]["cache_hits"] == 100
+
+
+def test_cache_new_column(tmp_path, monkeypatch):
+    # after a change of the column lists, rows built from the cache are the same as a new parse
+    input_path = Path("./tests/test_100")
+    cache_path = tmp_path / "cache"
+    run_form4(input_path, tmp_path, True, verbose=False, cache_path=cache_path)
+
+    col_name = Form4Data.nonderivative_col_name[:-1] + ["transactionCoding.equitySwapInvolved", "footnote"]
+    monkeypatch.setattr(Form4Data, "nonderivative_col_name", col_name)
+    for name, path in (("parsed", None), ("cached", cache_path)):
+        (tmp_path / name).mkdir()
+        report = run_form4(input_path, tmp_path / name, True, verbose=False, cache_path=path)
+    assert report["metrics"]["counters"]["cache_hits"] == 100
+    assert filecmp.cmp(tmp_path / "parsed" / "nonDerivative.csv", tmp_path / "cached" / "nonDerivative.csv", shallow=False)
+    df = pd.read_csv(tmp_path / "cached" / "nonDerivative.csv", dtype=str)
+    assert df["transactionCoding.equitySwapInvolved"].notna().any()
+
+
+def test_cache_eviction(tmp_path):
+    cache = Form4Cache(tmp_path, max_bytes=5000)
+    parts = ({"issuerCik": "1"}, [{}], {"nonDerivative": [{"x": "y" * 100}]}, {})
+    for i in range(100):
+        cache.put(Form4Cache.key(str(i).encode(), "stream"), parts, {"accessionNumber": str(i)})
+    cache.commit()
+    assert cache.get(Form4Cache.key(b"0", "stream")) is None
+    assert cache.get(Form4Cache.key(b"99", "stream"))[1] == {"accessionNumber": "99"}
+    size = cache._conn.execute("SELECT SUM(size) FROM filings").fetchone()[0]
+    assert size <= 5000
+    cache.close()
+
+
+def test_100_cache_workers(tmp_path):
+    # worker processes read the cache, only the main process writes it
+    input_path = Path("./tests/test_100")
+    cache_path = tmp_path / "cache"
+    for name in ("cold", "cached"):
+        output_path = tmp_path / name
+        output_path.mkdir()
+        report = run_form4(input_path, output_path, True, workers=2, verbose=False, cache_path=cache_path)
+        assert filecmp.cmp(output_path / "nonDerivative.csv", input_path / "nonDerivative.csv", shallow=False)
+    assert report["metrics"]["counters"]["cache_hits"] == 100
+
+
+def test_cache_pending(tmp_path):
+    # entries of a read only cache are saved by another obj, the size counter matches the table
+    cache  = Form4Cache(tmp_path)
+    reader = Form4Cache(tmp_path, readonly=True)
+    parts  = ({"issuerCik": "1"}, [{}], {}, {})
+    for i in range(3):
+        reader.put(Form4Cache.key(str(i).encode(), "stream"), parts, {})
+    cache.put(Form4Cache.key(b"0", "stream"), parts, {})
+    cache.add_pending(reader.take_pending())
+    cache.commit()
+    assert reader.get(Form4Cache.key(b"2", "stream")) is not None
+    assert cache._size == cache._conn.execute("SELECT SUM(size) FROM filings").fetchone()[0]
+    reader.close()
+    cache.close()
@@ -0,0 +1,43 @@
+import pandas as pd
+from pathlib import Path
+from edgar import Form4Data
+
+
+def test_compact(tmp_path):
+    input_file = Path("./tests/test_100/nonDerivative.csv")
+    data     = Form4Data(pd.read_csv(input_file, dtype=str))
+    expected = Form4Data(data.df.copy())
+
+    report = data.compact()
+    assert report["after"] < report["before"] / 2
+    assert report["columns"]["footnote"]["dtype"] == "category"
+    assert report["columns"]["issuerName"]["dtype"] == "category"
+    assert data.df["transactionAmounts.transactionShares.value"].dtype == "float64"
+    assert data.df["transactionDate.value"].dtype == "datetime64[ns]"
+
+    data.add_has_10b5()
+    expected.add_has_10b5()
+    assert (data.df["has_10b5"] == expected.df["has_10b5"]).all()
+    data.classify_footnotes()
+    expected.classify_footnotes()
+    for name in Form4Data.footnote_patterns:
+        assert (data.df[name] == expected.df[name]).all()
+
+    # chunks with different categories are merged
+    compact = Form4Data.load_csv(input_file, chunksize=50, compact=True)
+    typed   = Form4Data.load_csv(input_file, chunksize=50)
+    assert compact.df["issuerName"].dtype == "category"
+    assert list(compact.df["issuerName"].astype(object)) == list(typed.df["issuerName"])
+    assert sum(compact.memory_usage().values()) < sum(typed.memory_usage().values())
+
+
+def test_compact_distinct_footnotes():
+    # a chunk of distinct footnotes is still pooled, other distinct text columns stay strings
+    df = pd.DataFrame({"footnote": ["F1: note %d" % i for i in range(10)],
+                       "issuerName": ["Issuer %d" % i for i in range(10)],
+                       "ownershipNature.natureOfOwnership.value": ["By trust %d" % i for i in range(10)]})
+    compact = Form4Data.compact_df(df)
+    assert compact["footnote"].dtype == "category"
+    assert compact["issuerName"].dtype == "category"
+    assert compact["ownershipNature.natureOfOwnership.value"].dtype == object
+    assert list(compact["footnote"].astype(object)) == list(df["footnote"])
@@ -0,0 +1,71 @@
+import pytest
+import re
+import pandas as pd
+from pathlib import Path
+from edgar import Form4Data
+
+
+def test_classify_footnotes():
+    df = pd.DataFrame({"footnote": [
+        "F1: Shares withheld to cover taxes. F2: Weighted average price.",
+        None,
+        "F1: Sale under a Rule 10b5-1 trading plan adopted by the Smith Family Trust.",
+        "F1: Shares withheld to cover taxes. F2: Weighted average price.",
+        "F1: Bona fide gift to a charity; the reporting person disclaims beneficial ownership.",
+        ]})
+    data = Form4Data(df)
+    cache = {}
+    data.classify_footnotes(cache=cache)
+
+    flags = data.df[list(Form4Data.footnote_patterns)]
+    assert flags.dtypes.eq(bool).all()
+    assert flags.loc[0, "has_tax_withholding"] and flags.loc[0, "has_weighted_average"]
+    assert flags.loc[2, ["has_10b5", "has_trust"]].all()
+    assert flags.loc[4, ["has_gift", "has_indirect"]].all()
+    assert not flags.loc[1].any()
+    assert flags.sum().sum() == 8
+    # one scan per distinct text
+    assert len(cache) == 3
+
+    # patterns starting at the same position are all found
+    data.classify_footnotes({"a": "trading", "b": "trading plan", "c": "trad"})
+    assert data.df.loc[2, ["a", "b", "c"]].all()
+
+
+def test_100_classify_footnotes(tmp_path):
+    input_file = Path("./tests/test_100/nonDerivative.csv")
+    df = pd.read_csv(input_file, dtype=str)
+
+    data = Form4Data(df.copy())
+    data.classify_footnotes()
+    for name, pattern in Form4Data.footnote_patterns.items():
+        expected = [isinstance(t, str) and re.search(pattern, t, re.IGNORECASE) is not None for t in df["footnote"]]
+        assert data.df[name].tolist() == expected
+
+    # 10b5 column as before: case sensitive "10b5"
+    legacy = Form4Data(df.copy())
+    legacy.add_has_10b5()
+    assert legacy.df["has_10b5"].tolist() == [legacy.check_10b5(t) for t in df["footnote"]]
+
+    # same columns when the .csv file is read in chunks
+    output_file = tmp_path / "nonDerivative_flags.csv"
+    Form4Data.classify_footnotes_csv(input_file, output_file, chunksize=50)
+    pd.testing.assert_frame_equal(pd.read_csv(output_file, dtype=str), data.df.astype({n: str for n in Form4Data.footnote_patterns}))
+
+
+def test_classify_footnotes_patterns():
+    df = pd.DataFrame({"footnote": ["F1: Bona fide GIFT. F2: aa", "F1: gift g1", None]})
+    data = Form4Data(df)
+    # inline global flags, backreferences and named groups are searched as with re.search
+    patterns = {"gift": "(?-i:gift)", "upper": "(?i)GIFT", "double": r"(a)\1", "named": r"(?P<g1>g)1",
+                "dotall": "(?s)F1.*F2"}
+    data.classify_footnotes(patterns, cache={})
+    for name, pattern in patterns.items():
+        expected = [isinstance(t, str) and re.search(pattern, t, re.IGNORECASE) is not None for t in df["footnote"]]
+        assert data.df[name].tolist() == expected
+    assert data.df["double"].tolist() == [True, False, False]
+
+    # a combined expression that does not compile falls back to one search per pattern
+    data.classify_footnotes({"x": "(?x)gift # comment", "y": "fide"})
+    assert data.df["x"].tolist() == [True, True, False]
+    assert data.df["y"].tolist() == [True, False, False]
@@ -31,3 +31,56 @@ def test_100(tmp_path):
     assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
    
 
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -d
+def test_100_debug(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_debug"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, debug=True)
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+    assert len(list(output_path.glob("*.txt.mod"))) == 100
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -w 2
+def test_100_workers(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_workers"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, workers=2, chunksize=3)
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+
+
+# python main.py  -i ./tests/test_1 -o ./scratch -e stream
+def test_1_stream(tmp_path):
+    input_path  = Path("./tests/test_1")
+    output_path = tmp_path / "test_1_stream"
+    output_path.mkdir()
+    run_form4(input_path, output_path, False, engine="stream")
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -e stream
+def test_100_stream(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_stream"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, engine="stream")
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
@@ -0,0 +1,71 @@
+import pytest
+import filecmp
+from pathlib import Path
+from edgar import run_form4, form4_to_csv, Form4Writer, Form4Data
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -b 7
+def test_100_small_buffer(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_buffer"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, buffer_rows=7)
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+
+
+def test_append_after_partial_line(tmp_path):
+    columns = Form4Data.column_list("nonDerivative")
+    header  = ",".join(columns) + "\n"
+    rows    = [("a",) + (None,) * (len(columns) - 1), ("b,c",) + ("d",) * (len(columns) - 1)]
+    (tmp_path / "nonDerivative.csv").write_text(header + "a" + "," * (len(columns) - 1) + "\nb,trunc")
+
+    with Form4Writer(tmp_path) as writer:
+        writer.add("nonDerivative", rows)
+        # nothing written until flush or close
+        assert (tmp_path / "nonDerivative.csv").read_text() == header + "a" + "," * (len(columns) - 1) + "\n"
+
+    lines = (tmp_path / "nonDerivative.csv").read_text().splitlines()
+    assert lines[1] == lines[2] == "a" + "," * (len(columns) - 1)
+    assert lines[3] == '"b,c",' + ",".join(["d"] * (len(columns) - 1))
+
+
+def test_append_after_partial_multiline_row(tmp_path):
+    # a footnote with a line ending, cut by an interrupted run, is removed up to the last complete row
+    columns = Form4Data.column_list("nonDerivative")
+    rows    = [("a",) + (None,) * (len(columns) - 2) + ("F1: first line\nsecond line",)]
+    with Form4Writer(tmp_path) as writer:
+        writer.add("nonDerivative", rows)
+    complete = (tmp_path / "nonDerivative.csv").read_bytes()
+    with open(tmp_path / "nonDerivative.csv", 'ab') as f:
+        f.write(b'b' + b',' * (len(columns) - 1) + b'"F1: cut\nhere')
+
+    with Form4Writer(tmp_path) as writer:
+        writer.add("nonDerivative", rows)
+    assert (tmp_path / "nonDerivative.csv").read_bytes() == complete + complete.split(b"\n", 1)[1]
+
+    # without the saved offset, quoted line endings are not taken for row endings
+    (tmp_path / "nonDerivative.csv.offset").unlink()
+    with open(tmp_path / "nonDerivative.csv", 'ab') as f:
+        f.write(b'b' + b',' * (len(columns) - 1) + b'"F1: cut\nhere')
+    with Form4Writer(tmp_path) as writer:
+        writer.add("nonDerivative", [])
+    assert (tmp_path / "nonDerivative.csv").read_bytes() == complete + complete.split(b"\n", 1)[1]
+
+
+def test_keep_rows_appended_by_another_writer(tmp_path, capsys):
+    # rows appended by save_df_to_csv do not update the saved offset, they are complete and kept
+    input_path = Path("./tests/test_1")
+    filename   = "912728_4_0000912728-20-000168.txt"
+    run_form4(input_path, tmp_path, False, verbose=False)
+    form4_to_csv(input_path, tmp_path, filename)
+    appended = (tmp_path / "nonDerivative.csv").read_bytes()
+    run_form4(input_path, tmp_path, False, verbose=False)
+
+    assert "partial" not in capsys.readouterr().out
+    rows = (input_path / "nonDerivative.csv").read_bytes().split(b"\n", 1)[1]
+    assert (tmp_path / "nonDerivative.csv").read_bytes() == appended + rows
+    assert appended.count(rows) == 2
@@ -0,0 +1,31 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+from edgar import Form4Data
+
+
+def test_100_load_csv():
+    input_file = Path("./tests/test_100/nonDerivative.csv")
+    full = Form4Data.typed_df(pd.read_csv(input_file, dtype=str))
+
+    # all rows, in chunks
+    chunks = list(Form4Data.iter_csv(input_file, chunksize=40))
+    assert len(chunks) == 7
+    pd.testing.assert_frame_equal(pd.concat([c.df for c in chunks], ignore_index=True), full)
+
+    # filters and column projection
+    columns = ["issuerCik", "transactionAmounts.transactionShares.value"]
+    data = Form4Data.load_csv(input_file, columns, chunksize=40, issuer_cik=[1490892, "0001517342"],
+                              transaction_code="S", date_from="2020-01-01", date_to="2020-12-31")
+    expected = full[full["issuerCik"].isin(["0001490892", "0001517342"])
+                    & (full["transactionCoding.transactionCode"] == "S")
+                    & full["transactionDate.value"].between("2020-01-01", "2020-12-31")]
+    assert len(expected) > 0
+    assert list(data.df.columns) == columns
+    pd.testing.assert_frame_equal(data.df, expected[columns].reset_index(drop=True))
+    assert data.df["transactionAmounts.transactionShares.value"].dtype == "float64"
+
+    # nothing selected
+    data = Form4Data.load_csv(input_file, owner_cik="1")
+    assert data.df.empty and list(data.df.columns) == list(full.columns)
+    assert data.df["transactionDate.value"].dtype == "datetime64[ns]"
@@ -0,0 +1,66 @@
+import pytest
+import os
+import shutil
+import tarfile
+import filecmp
+from pathlib import Path
+from edgar import run_form4
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True --incremental
+def test_100_incremental(tmp_path):
+    input_path  = tmp_path / "input"
+    output_path = tmp_path / "test_100_incremental"
+    shutil.copytree("./tests/test_100", input_path)
+    output_path.mkdir()
+
+    report = run_form4(input_path, output_path, True, incremental=True)
+    assert len(report["processed"]) == 100
+
+    # second run: nothing to do, outputs unchanged
+    report = run_form4(input_path, output_path, True, incremental=True)
+    assert len(report["skipped"]) == 100 and not report["processed"]
+
+    nd = 'nonDerivative.csv'
+    d = 'derivative.csv'
+    assert filecmp.cmp(str(output_path / nd), str(input_path / nd), shallow=False)
+    assert filecmp.cmp(str(output_path / d), str(input_path / d), shallow=False)
+
+    # touched file is skipped by content hash, edited file is processed again
+    touched = input_path / "912728_4_0000912728-20-000168.txt"
+    os.utime(touched, ns=(0, 0))
+    edited = input_path / "1023844_1_0001437749-20-000181.txt"
+    edited.write_text(edited.read_text() + "\n")
+
+    report = run_form4(input_path, output_path, True, incremental=True)
+    assert report["processed"] == report["changed"] == [edited.name]
+    # csv rows are appended, the old rows of the edited file stay
+    assert report["stale"] == [edited.name]
+    assert touched.name in report["skipped"]
+
+    # another output format in the same directory is not skipped by the csv entries
+    report = run_form4(input_path, output_path, True, incremental=True, output_format="sqlite", verbose=False)
+    assert len(report["processed"]) == 100 and not report["changed"]
+    edited.write_text(edited.read_text() + "\n")
+    report = run_form4(input_path, output_path, True, incremental=True, output_format="sqlite", verbose=False)
+    # sqlite replaces the rows of the edited file
+    assert report["processed"] == report["changed"] == [edited.name]
+    assert not report["stale"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_archive_duplicate_basenames(tmp_path, workers):
+    # a/X.txt and b/X.txt have the same filename in the archive: the second one is reported, not written twice
+    input_path = Path("./tests/test_100")
+    filenames  = [line.strip() for line in open(input_path / "list_txt")][:5]
+    archive    = tmp_path / "dup.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        for directory in ("a", "b"):
+            for filename in filenames:
+                tf.add(input_path / filename, directory + "/" + filename)
+
+    report = run_form4(archive, tmp_path, False, workers=workers, chunksize=2, incremental=True, verbose=False)
+    assert report["processed"] == report["duplicate"] == filenames
+
+    rows = (tmp_path / "nonDerivative.csv").read_text().splitlines()
+    assert len(rows) == len(set(rows))
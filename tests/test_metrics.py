@@ -0,0 +1,42 @@
+import pytest
+import pstats
+from pathlib import Path
+from edgar import run_form4, Form4Metrics
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -q --metrics_json ./scratch/metrics.json --profile ./scratch/run.prof
+@pytest.mark.parametrize("workers", [1, 2])
+def test_100_metrics(tmp_path, capsys, workers):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_metrics"
+    output_path.mkdir()
+    profile = tmp_path / "run.prof"
+
+    report = run_form4(input_path, output_path, True, workers=workers, verbose=False, profile=str(profile), top_n=3)
+    assert "Processing:" not in capsys.readouterr().out
+
+    metrics = report["metrics"]
+    assert metrics["counters"]["files"] == 100
+    assert metrics["counters"]["rows.nonDerivative"] == 273
+    assert metrics["counters"]["rows.derivative"] == 133
+    assert metrics["counters"]["footnotes"] == 220
+    assert metrics["counters"]["bytes"] == sum((input_path / f).stat().st_size for f in report["processed"])
+    assert set(metrics["stages"]) == {"read", "extract_xml", "preprocess", "parse_xml", "records", "write"}
+    assert len(metrics["slowest"]) == 3
+    assert metrics["slowest"][0]["seconds"] >= metrics["slowest"][-1]["seconds"]
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def test_metrics_merge():
+    a = Form4Metrics(top_n=2)
+    b = Form4Metrics(top_n=2)
+    a.add_file("a.txt", 10, 0.1, [("nonDerivative", [(), ()])])
+    b.add_file("b.txt", 20, 0.3, [("derivative", [()])])
+    b.add_file("c.txt", 30, 0.2, [])
+    b.add_time("read", 1.0)
+    a.merge(b)
+    result = a.to_dict(seconds=2.0)
+    assert result["counters"]["files"] == 3 and result["counters"]["bytes"] == 60
+    assert result["counters"]["rows.nonDerivative"] == 2 and result["counters"]["rows.derivative"] == 1
+    assert [item["filename"] for item in result["slowest"]] == ["b.txt", "c.txt"]
+    assert result["files_per_s"] == 1.5
@@ -0,0 +1,33 @@
+import pytest
+import shutil
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, Form4Data
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True --normalized --header_cols
+def test_100_normalized(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_normalized"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, normalized=True, header_cols=True)
+
+    issuers = pd.read_csv(output_path / "issuers.csv", dtype=str)
+    owners  = pd.read_csv(output_path / "reportingOwners.csv", dtype=str)
+    assert issuers["issuerKey"].is_unique and owners["ownerKey"].is_unique
+    assert list(issuers.columns) == Form4Data.column_list("issuers")
+    assert len(issuers) <= 100 and len(owners) <= 129
+
+    for table_name in ("nonDerivative", "derivative"):
+        data = Form4Data.from_normalized(output_path, table_name)
+        assert list(data.df.columns) == Form4Data.column_list(table_name) + Form4Data.header_col_name
+        # same text as the .csv database
+        text = data.df[Form4Data.column_list(table_name)].to_csv(index=False)
+        assert text == (input_path / (table_name + ".csv")).read_text()
+
+    # a second run reuses the keys: no new issuers or owners, fact rows appended
+    n_facts = len(pd.read_csv(output_path / "nonDerivativeFact.csv"))
+    run_form4(input_path, output_path, True, normalized=True, header_cols=True)
+    assert len(pd.read_csv(output_path / "issuers.csv")) == len(issuers)
+    assert len(pd.read_csv(output_path / "reportingOwners.csv")) == len(owners)
+    assert len(pd.read_csv(output_path / "nonDerivativeFact.csv")) == 2 * n_facts
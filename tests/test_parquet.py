@@ -0,0 +1,30 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, Form4Data
+
+pytest.importorskip("pyarrow")
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -f parquet
+def test_100_parquet(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_parquet"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, engine="stream", output_format="parquet")
+
+    for table_name in ("nonDerivative", "derivative"):
+        csv_df = pd.read_csv(input_path / (table_name + ".csv"), dtype=str)
+        f4 = Form4Data.from_parquet(output_path, table_name)
+        assert len(f4.df) == len(csv_df)
+        assert f4.df["transactionAmounts.transactionShares.value"].dtype == "float64"
+        assert f4.df["transactionDate.value"].dtype == "datetime64[ns]"
+        assert f4.df["reportingOwnerRelationship.isOfficer"].dtype == "boolean"
+        assert set(csv_df["issuerCik"]) == set(f4.df["issuerCik"])
+
+    # column projection and partition pruning
+    f4 = Form4Data.from_parquet(output_path, "nonDerivative", columns=["issuerCik", "filingDate"],
+                                filters=[("filing_year", "=", 2020), ("filing_quarter", "=", 4)])
+    assert list(f4.df.columns) == ["issuerCik", "filingDate"]
+    assert len(f4.df) > 0
+    assert (f4.df["filingDate"].dt.quarter == 4).all()
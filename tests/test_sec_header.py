@@ -0,0 +1,52 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, HeaderFilter, read_sec_header
+
+
+def test_read_sec_header():
+    header = read_sec_header(Path("./tests/test_100/1023844_1_0001437749-20-000181.txt"))
+    assert header == {
+        "accessionNumber": "0001437749-20-000181",
+        "submissionType": "4",
+        "periodOfReport": "2019-12-23",
+        "filingDate": "2020-01-03",
+        "issuerCik": "0001023844",
+        "issuerSic": "6200",
+        }
+
+
+def test_header_filter():
+    header = {"issuerCik": "0001023844", "issuerSic": "6200", "filingDate": "2020-01-03", "submissionType": "4"}
+    assert HeaderFilter().match(header)
+    assert HeaderFilter.from_args() is None
+    assert HeaderFilter.from_args(cik="1023844, 320193").match(header)
+    assert HeaderFilter.from_args(sic="6000-6799").match(header)
+    assert not HeaderFilter.from_args(sic="7372").match(header)
+    assert HeaderFilter.from_args(date_from="2020-01-03", date_to="2020-01-03").match(header)
+    assert not HeaderFilter.from_args(date_from="2020-01-04").match(header)
+    assert not HeaderFilter.from_args(form_type="4/A").match(header)
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True --sic 2834 --header_cols
+def test_100_header_filter(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_header_filter"
+    output_path.mkdir()
+
+    report = run_form4(input_path, output_path, True, header_filter=HeaderFilter.from_args(sic="2834"),
+                       header_cols=True)
+    assert len(report["processed"]) == 10
+    assert len(report["filtered"]) == 90
+
+    ciks = {read_sec_header(input_path / f)["issuerCik"] for f in report["processed"]}
+    for table_name in ("nonDerivative", "derivative"):
+        expected = pd.read_csv(input_path / (table_name + ".csv"), dtype=str)
+        expected = expected[expected["issuerCik"].isin(ciks)].reset_index(drop=True)
+        df = pd.read_csv(output_path / (table_name + ".csv"), dtype=str)
+        assert list(df.columns[-2:]) == ["accessionNumber", "filingDate"]
+        pd.testing.assert_frame_equal(df[expected.columns], expected)
+
+    # .csv files written with other columns are not appended to
+    with pytest.raises(ValueError):
+        run_form4(input_path, output_path, True, header_filter=HeaderFilter.from_args(sic="2834"))
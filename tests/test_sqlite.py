@@ -0,0 +1,52 @@
+import sqlite3
+import shutil
+import pandas as pd
+from pathlib import Path
+from edgar import run_form4, Form4Data
+
+
+# python main.py  -i ./tests/test_100 -o ./scratch -l True -f sqlite
+def test_100_sqlite(tmp_path):
+    input_path  = Path("./tests/test_100")
+    output_path = tmp_path / "test_100_sqlite"
+    output_path.mkdir()
+    run_form4(input_path, output_path, True, engine="stream", output_format="sqlite", buffer_rows=50, verbose=False)
+
+    database = output_path / "form4.db"
+    for table_name in ("nonDerivative", "derivative"):
+        csv_df = pd.read_csv(input_path / (table_name + ".csv"), dtype=str)
+        f4 = Form4Data.from_sqlite(database, table_name)
+        assert len(f4.df) == len(csv_df)
+        assert f4.df["transactionAmounts.transactionShares.value"].dtype == "float64"
+        assert f4.df["transactionDate.value"].dtype == "datetime64[ns]"
+        assert f4.df["reportingOwnerRelationship.isOfficer"].dtype == "boolean"
+        assert set(csv_df["issuerCik"]) == set(f4.df["issuerCik"])
+
+    f4 = Form4Data.from_sqlite(database, "nonDerivative", "issuerCik = ?", ("0001023844",))
+    assert len(f4.df) > 0
+    assert (f4.df["issuerCik"] == "0001023844").all()
+
+    with sqlite3.connect(database) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = conn.execute('EXPLAIN QUERY PLAN SELECT * FROM nonDerivative WHERE "reportingOwnerId.rptOwnerCik" = ?',
+                            ("0001234567",)).fetchall()
+        assert "USING INDEX" in plan[0][-1]
+
+
+def test_sqlite_reprocess(tmp_path):
+    # a filing processed again replaces its rows
+    input_path  = tmp_path / "input"
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    shutil.copytree("./tests/test_100", input_path)
+    run_form4(input_path, output_path, False, output_format="sqlite", verbose=False)
+
+    database = output_path / "form4.db"
+    before = {t: len(Form4Data.from_sqlite(database, t).df) for t in ("nonDerivative", "derivative")}
+
+    filename = sorted(input_path.glob("*.txt"))[0]
+    (input_path / "list_txt").write_text(filename.name + "\n")
+    run_form4(input_path, output_path, True, output_format="sqlite", verbose=False)
+
+    after = {t: len(Form4Data.from_sqlite(database, t).df) for t in ("nonDerivative", "derivative")}
+    assert after == before
@@ -0,0 +1,30 @@
+import pytest
+import filecmp
+from pathlib import Path
+from edgar import run_form4
+from benchmarks.synth_form4 import write_synth_form4
+from benchmarks.bench_suite import check_baseline
+
+
+# python -m benchmarks.synth_form4 -o ./scratch/synth -n 50
+def test_synth_engines(tmp_path):
+    input_path = tmp_path / "synth"
+    filenames  = write_synth_form4(input_path, 50, "./data/form-4", seed=1)
+    assert len(filenames) == 50
+    assert write_synth_form4(tmp_path / "synth_again", 50, "./data/form-4", seed=1) == filenames
+    assert (input_path / filenames[7]).read_text() == (tmp_path / "synth_again" / filenames[7]).read_text()
+
+    # both engines read the synthetic filings the same way
+    for engine in ("xmltodict", "stream"):
+        (tmp_path / engine).mkdir()
+        report = run_form4(input_path, tmp_path / engine, True, engine=engine)
+        assert len(report["processed"]) == 50
+    for table_name in ("nonDerivative.csv", "derivative.csv"):
+        assert filecmp.cmp(str(tmp_path / "xmltodict" / table_name), str(tmp_path / "stream" / table_name), shallow=False)
+
+
+def test_check_baseline():
+    baseline = {"stream/1000": {"filings_per_s": 1000.0}}
+    assert check_baseline({"stream/1000": {"filings_per_s": 850.0}}, baseline, 0.2) == []
+    assert len(check_baseline({"stream/1000": {"filings_per_s": 750.0}}, baseline, 0.2)) == 1
+    assert check_baseline({"stream/10000": {"filings_per_s": 1.0}}, baseline, 0.2) == []
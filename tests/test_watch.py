@@ -0,0 +1,56 @@
+import shutil
+import pandas as pd
+from pathlib import Path
+from edgar import watch_form4, Form4Watcher
+
+
+def test_watcher_waits_for_complete_files(tmp_path):
+    fileloc = tmp_path / "0001437749-20-000181.txt"
+    fileloc.write_text("<SEC-DOCUMENT>")
+    (tmp_path / "list_txt").write_text("")
+
+    watcher = Form4Watcher(tmp_path, settle=0)
+    # first sighting, the file may still be written
+    assert watcher.poll() == []
+    with open(fileloc, 'a') as f:
+        f.write("more")
+    assert watcher.poll() == []
+    # unchanged since the last poll
+    assert [name for name, mtime in watcher.poll()] == [fileloc.name]
+    assert watcher.poll() == []
+
+
+def test_watch_100(tmp_path):
+    input_path  = Path("./tests/test_100")
+    spool_path  = tmp_path / "spool"
+    output_path = tmp_path / "output"
+    spool_path.mkdir()
+    output_path.mkdir()
+    filenames = (input_path / "list_txt").read_text().split()
+    for filename in filenames:
+        shutil.copy(input_path / filename, spool_path / filename)
+
+    report = watch_form4(spool_path, output_path, interval=0.01, settle=0, batch_size=30, engine="stream",
+                         verbose=False, idle_timeout=0.1)
+    assert sorted(report["processed"]) == sorted(filenames)
+    assert report["metrics"]["latency"]["files"] == len(filenames)
+
+    for table_name in ("nonDerivative", "derivative"):
+        expected = pd.read_csv(input_path / (table_name + ".csv"), dtype=str)
+        df = pd.read_csv(output_path / (table_name + ".csv"), dtype=str)
+        assert len(df) == len(expected)
+        assert sorted(df["issuerCik"]) == sorted(expected["issuerCik"])
+
+    # a restart skips the files already processed
+    report = watch_form4(spool_path, output_path, interval=0.01, settle=0, verbose=False, idle_timeout=0.1)
+    assert report["processed"] == []
+    assert len(report["skipped"]) == len(filenames)
+
+
+def test_watch_profile_cache(tmp_path):
+    input_path = Path("./tests/test_100")
+    profile    = tmp_path / "watch.prof"
+    report = watch_form4(input_path, tmp_path, interval=0.01, settle=0, verbose=False, idle_timeout=0.1,
+                         profile=str(profile), cache_path=tmp_path / "cache")
+    assert profile.exists()
+    assert report["metrics"]["counters"]["cache_misses"] == 100